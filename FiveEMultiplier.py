@@ -6,20 +6,41 @@ Created on Wed Dec 18 18:00:51 2024
 @author: adamhammond
 """
 import os
-import contextlib
+import random
 import matplotlib.pyplot as plt
 from collections import Counter
 from FiveESimulations import sim  # Import your simulation function here
-
-# Suppress print statements
-@contextlib.contextmanager
-def suppress_print():
-    with open(os.devnull, 'w') as fnull:
-        with contextlib.redirect_stdout(fnull), contextlib.redirect_stderr(fnull):
-            yield  # Control returns to the block that uses this context manager
+from batch_stats import game_rng
+from batch_runner import save_checkpoint, load_checkpoint, estimate_footprint, run_budgeted, as_results
+from dashboard import SnapshotWriter
 
 # Function to run multiple simulations
-def run_multiple_simulations(num_simulations=1000):
+# checkpoint: optional index file; every checkpoint_every games the games played since the last checkpoint go to
+# their own file next to it ({checkpoint}.games<first game>) and the index records those files and the RNG state.
+# resume=True continues from the index; the final result matches an uninterrupted run.
+# seed: optional; game i then uses its own stream game_rng(seed, i) instead of the global random module.
+# snapshot: optional JSON file the running plot counts are written to every snapshot_every games (see dashboard.py).
+# memory_budget: optional bytes; a run whose results would not fit goes through batch_runner.run_budgeted instead:
+# with spill_dir its lists are spilled to files there and read back lazily, without one the full logs (and whatever
+# else does not fit) are dropped and only the rest is kept. The strategy chosen is printed. Checkpoints (one per
+# checkpoint_every games) and snapshots are written by run_budgeted on that path. An unseeded run draws its seed
+# from the random module, and a resumed one takes it from the checkpoint.
+def run_multiple_simulations(num_simulations=1000, seed=None, checkpoint=None, checkpoint_every=10000, resume=False,
+                             snapshot=None, snapshot_every=1000, memory_budget=None, spill_dir=None):
+    if memory_budget is not None and estimate_footprint('FiveESimulations', num_simulations)['total'] > memory_budget:
+        if seed is None:
+            if resume and checkpoint and os.path.exists(checkpoint):
+                seed = load_checkpoint(checkpoint)['seed']  # The seed drawn when the run started
+            else:
+                seed = random.getrandbits(64)  # run_budgeted plays every game on its own seeded stream
+        aggregates, plan = run_budgeted('FiveESimulations', 'DemonDiceTable4', num_simulations, seed,
+                                        memory_budget=memory_budget, spill_dir=spill_dir, chunk_size=checkpoint_every,
+                                        checkpoint=checkpoint, resume=resume, snapshot=snapshot,
+                                        snapshot_every=snapshot_every)
+        if plan['strategy'] == 'spill':
+            print(f"Results spilled to {len(plan['spill_files'])} files in {spill_dir}")
+        return as_results('FiveESimulations', aggregates)
+
     turns_list = []           # How long each sim lasted
     end_mechanisms = []       # What caused the end
     fight_count = []          # Number of fights
@@ -27,10 +48,33 @@ def run_multiple_simulations(num_simulations=1000):
     sim_logs = []
     all_turns = []            # Turn numbers for all rolls (across all sims)
     all_rolls = []            # Corresponding total rolls
+    results = (turns_list, end_mechanisms, fight_count, first_end_turns, all_turns, all_rolls, sim_logs)
+
+    start = 0
+    chunk_files = []  # Files holding the games checkpointed so far, in game order
+    if resume and checkpoint and os.path.exists(checkpoint):
+        # strategy=None refuses an index that run_budgeted wrote for an over-budget run
+        state = load_checkpoint(checkpoint, num_simulations=num_simulations, seed=seed, strategy=None)
+        chunk_files = state['chunk_files']
+        for path in chunk_files:
+            for saved, current in zip(load_checkpoint(path), results):
+                current.extend(saved)
+        start = state['next_game']
+        if seed is None:
+            random.setstate(state['random_state'])  # Pick the shared stream up where it stopped
+        print(f"Resuming from game {start} of {num_simulations}")
+
+    writer = SnapshotWriter(snapshot, num_simulations, snapshot_every, seed=seed) if snapshot else None
+    if writer:
+        for simulation_log, f_count in zip(sim_logs, fight_count):  # Games restored from a checkpoint
+            writer.game(simulation_log, f_count)
 
-    for _ in range(num_simulations):
-        with suppress_print():  # Suppress print statements
-            simulation_log, f_count = sim()
+    chunk_start = start  # First game not yet in a chunk file
+    saved_lengths = [len(current) for current in results]
+
+    for game in range(start, num_simulations):
+        rng = game_rng(seed, game) if seed is not None else None
+        simulation_log, f_count = sim(rng=rng, verbose=False)  # Silent, without redirecting stdout
         sim_logs.append(simulation_log)
         last_entry = simulation_log[-1]
         turns_list.append(last_entry['turn'])
@@ -56,6 +100,24 @@ def run_multiple_simulations(num_simulations=1000):
             all_turns.append(i + 1)
             all_rolls.append(entry['total_roll'])
 
+        if writer:
+            writer.game(simulation_log, f_count)
+
+        if checkpoint and ((game + 1) % checkpoint_every == 0 or game + 1 == num_simulations):
+            # Only the new games are written, so each checkpoint costs the same however far the run is
+            chunk_file = f"{checkpoint}.games{chunk_start:010d}"
+            save_checkpoint(chunk_file, tuple(current[n:] for current, n in zip(results, saved_lengths)))
+            chunk_files.append(chunk_file)
+            chunk_start = game + 1
+            saved_lengths = [len(current) for current in results]
+            save_checkpoint(checkpoint, {
+                'num_simulations': num_simulations,
+                'seed': seed,
+                'next_game': game + 1,
+                'random_state': random.getstate() if seed is None else None,
+                'chunk_files': chunk_files
+            })
+
     return turns_list, end_mechanisms, fight_count, first_end_turns, all_turns, all_rolls, sim_logs
 
 # Main execution block
@@ -7,14 +7,17 @@ Created on Wed Dec 11 22:15:38 2024
 """
 import csv
 import random
-import numpy as np  # Import NumPy for fitting line calculations
-import matplotlib.pyplot as plt
 from collections import defaultdict
 
 # 
 dice_chain = [4, 6, 8, 10, 12, 20]
+start_dice = [4, 6]  # Demon Dice every game starts on
 
-def read_rules_from_csv(file_name):
+def _no_print(*args, **kwargs):
+    pass  # Stands in for print when verbose=False
+
+def read_rules_from_csv(file_name, verbose=True):
+    show = print if verbose else _no_print  # verbose=False keeps loading silent without touching sys.stdout
     rules = []
     try:
         with open(file_name, mode='r') as file:
@@ -22,7 +25,7 @@ def read_rules_from_csv(file_name):
             for row in csv_reader:
                 # Check if the row has the correct number of columns before processing
                 if len(row) < 4:  # Make sure there are at least four columns
-                    print(f"Warning: Row skipped due to insufficient columns: {row}")
+                    show(f"Warning: Row skipped due to insufficient columns: {row}")
                     continue
                 
                 flavor_text = row[0]  # First column: Flavor text
@@ -44,7 +47,7 @@ def read_rules_from_csv(file_name):
                 rules.append(rule)
 
         # Print rules after reading the file
-        print("Rules loaded successfully:")
+        show("Rules loaded successfully:")
        # for rule in rules:
            # print(rule)
         
@@ -55,8 +58,10 @@ def read_rules_from_csv(file_name):
 
     return rules
 
-def roll_dice(size):
-    return random.randint(1, size)  # Simulates rolling a die of specified size
+def roll_dice(size, rng=None):
+    if rng is None:
+        rng = random  # Fall back to the shared module-level generator
+    return rng.randint(1, size)  # Simulates rolling a die of specified size
 
 def change_dice_size(demon_dice, change, last_rolls):
     """
@@ -111,30 +116,42 @@ def change_dice_size_single(current_size, change):
 
     return current_size  # If the size is not found in the chain, return it unchanged
 
-def sim(filename="DemonDiceTable4"):  # sim() can be used from the command line to run a simulation
+def sim(filename="DemonDiceTable4", rng=None, rules=None, verbose=True, resume=None, on_turn=None):  # sim() can be used from the command line to run a simulation
+    # rng: optional random.Random; passing one with a fixed seed replays the same dice stream
+    # rules: optional already-loaded rules list, skips re-reading the CSV on every game
+    # verbose=False plays silently; unlike redirecting stdout this is safe to run from several threads
+    # on_turn: optional callback(game_state, seen_once_events, log), called at the start of every turn before the roll
+    # resume: optional (game_state, seen_once_events, log) as passed to on_turn; play continues from that point
+    # (with rng in the state it had then), so a replay can skip the turns it shares with another game
+    show = print if verbose else _no_print
     # Append .csv to the filename
     file_name = f"{filename}.csv"
     
-    rules = read_rules_from_csv(file_name)  # Load your rules from the CSV file
+    if rules is None:
+        rules = read_rules_from_csv(file_name, verbose)  # Load your rules from the CSV file
 
     game_state = {
         'turns': 0,
         'cumulative_damage': 0,  # Initialize cumulative damage
-        'demon_dice': [4, 6],
+        'demon_dice': start_dice[:],
         'fight_count': 0,  # Initialize fight count
         'accelerate_mode': False,
         'end_flags_count': 0  # Count of unique "End" flags triggered
     }
 
     log = []
-    print("Starting simulation of the Demon Dice.")
+    show("Starting simulation of the Demon Dice.")
     seen_once_events = set()  # Track which 'Once' events have been used
+    if resume is not None:  # Copies, so the game it was taken from is left as it was
+        game_state, seen_once_events, log = dict(resume[0]), set(resume[1]), list(resume[2])
 
     while True:
+        if on_turn is not None:
+            on_turn(game_state, seen_once_events, log)
         game_state['turns'] += 1  # Increment turn counter
 
         # Roll both Demon Dice
-        rolls = [roll_dice(size) for size in game_state['demon_dice']]
+        rolls = [roll_dice(size, rng) for size in game_state['demon_dice']]
         total_roll = sum(rolls)
 
         # Prepare log entry
@@ -150,19 +167,19 @@ def sim(filename="DemonDiceTable4"):  # sim() can be used from the command line
         # Check for end conditions
         if total_roll >= 36:
             total_roll = 35
-            print("Achieved total roll of 36 or more.")
+            show("Achieved total roll of 36 or more.")
 #            log_entry['events'].append('Rolled 36')
  #           log.append(log_entry)
 #            break
         
         if game_state['turns'] >= 200:
-            print("Too many turns!")
+            show("Too many turns!")
             log_entry['events'].append('200 turns')
             log.append(log_entry)
             break
         
         if game_state['cumulative_damage'] >= 100:
-            print("Too much damage!")
+            show("Too much damage!")
             log_entry['events'].append('TPK')
             log.append(log_entry)
             break
@@ -170,7 +187,7 @@ def sim(filename="DemonDiceTable4"):  # sim() can be used from the command line
         # Get the rule based on the total roll
         rule_index = total_roll - 2
         if rule_index < 0 or rule_index >= len(rules):
-            print("Invalid rule index. Skipping...")
+            show("Invalid rule index. Skipping...")
             continue
 
         rule = rules[rule_index]
@@ -197,7 +214,7 @@ def sim(filename="DemonDiceTable4"):  # sim() can be used from the command line
                     game_state['end_flags_count'] += 1
                     
                     if game_state['end_flags_count'] >= 4:  # Condition to check if all end flags have been triggered
-                        print("All 'End' flags triggered. Ending game.")
+                        show("All 'End' flags triggered. Ending game.")
                         log_entry['events'].append('End Flags')
                         log.append(log_entry)
                         break  # Break the loop to end the game
@@ -209,7 +226,7 @@ def sim(filename="DemonDiceTable4"):  # sim() can be used from the command line
                     game_state['end_flags_count'] += 1
                     
                     if game_state['end_flags_count'] >= 4:  # Condition to check if all end flags have been triggered
-                        print("All 'End' flags triggered. Ending game.")
+                        show("All 'End' flags triggered. Ending game.")
                         log_entry['events'].append('End Flags')
                         log.append(log_entry)
                         break  # Break the loop to end the game
@@ -217,7 +234,7 @@ def sim(filename="DemonDiceTable4"):  # sim() can be used from the command line
                         log_entry['events'].append(f'Repeat End {game_state["end_flags_count"]}')
                 
                 else:
-                    print("Reapplying rule 5 due to repeated event flag.")
+                    show("Reapplying rule 5 due to repeated event flag.")
                     rule = rules[3]  # Default to rule 5 if it's used again
      
 
@@ -232,13 +249,17 @@ def sim(filename="DemonDiceTable4"):  # sim() can be used from the command line
 
         log.append(log_entry)
         # Print outcome of the turn
-        print(f"{rule['flavor_text']}")
-        print(f"Turn {log_entry['turn']}: Demon Dice: {log_entry['demon_dice']}, Rolls: {log_entry['rolls']}, Total: {log_entry['total_roll']}, Cumulative Damage: {game_state['cumulative_damage']}, Events: {log_entry['events']}, Fight Count: {game_state['fight_count']}, End Count: {game_state['end_flags_count']}.")
+        show(f"{rule['flavor_text']}")
+        show(f"Turn {log_entry['turn']}: Demon Dice: {log_entry['demon_dice']}, Rolls: {log_entry['rolls']}, Total: {log_entry['total_roll']}, Cumulative Damage: {game_state['cumulative_damage']}, Events: {log_entry['events']}, Fight Count: {game_state['fight_count']}, End Count: {game_state['end_flags_count']}.")
 
     return log, game_state['fight_count']
 
 
 def plog(log):
+    # Plotting imports live here so running games never pays for NumPy or matplotlib
+    import numpy as np  # Import NumPy for fitting line calculations
+    import matplotlib.pyplot as plt
+
     if not log:  # Check if the log is empty
         print("No data to plot.")
         return
@@ -277,6 +298,8 @@ def plog(log):
     plt.show()
     
 def probGraph(log):
+    import matplotlib.pyplot as plt
+
     expected_counts = defaultdict(float)
     actual_totals = []
     die_pairs = []
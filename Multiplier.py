@@ -5,19 +5,10 @@ Created on Wed Dec 18 18:00:51 2024
 
 @author: adamhammond
 """
-import os
-import contextlib
 import matplotlib.pyplot as plt
 from collections import Counter
 from simulations import sim  # Import your simulation function here
 
-# Suppress print statements
-@contextlib.contextmanager
-def suppress_print():
-    with open(os.devnull, 'w') as fnull:
-        with contextlib.redirect_stdout(fnull), contextlib.redirect_stderr(fnull):
-            yield  # Control returns to the block that uses this context manager
-
 # Function to run multiple simulations
 def run_multiple_simulations(num_simulations=1000):
     turns_list = []  # To store the number of turns for each simulation
@@ -26,8 +17,7 @@ def run_multiple_simulations(num_simulations=1000):
     first_end_turns = [] 
 
     for _ in range(num_simulations):
-        with suppress_print():  # Suppress print statements during the simulation
-            simulation_log, f_count = sim()  # Run the Demon Dice simulation once
+        simulation_log, f_count = sim(verbose=False)  # Run the Demon Dice simulation once, silently
         # Retrieve the last log entry to get the number of turns and end mechanism
         last_entry = simulation_log[-1]
         turns_list.append(last_entry['turn'])
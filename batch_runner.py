@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parallel, chunked and memory-budgeted batch runs of the game engines.
+"""
+import os
+import sys
+import pickle
+import importlib
+import threading
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from batch_stats import game_stream
+from dashboard import SnapshotWriter, new_counts, add_aggregates, write_snapshot
+
+# Everything FiveEMultiplier.run_multiple_simulations returns, in its order
+OUTPUTS = ('turns_list', 'end_mechanisms', 'fight_count', 'first_end_turns', 'all_turns', 'all_rolls', 'sim_logs')
+
+PER_GAME_OUTPUTS = ('turns_list', 'end_mechanisms', 'fight_count', 'first_end_turns')  # One small int or str per game
+PER_TURN_OUTPUTS = ('all_turns', 'all_rolls')  # One int per turn played
+# Count tables (sketches.py, occupancy.py) that merge by addition; their size does not grow with the games
+ADDITIVE_OUTPUTS = ('sketches', 'occupancy')
+COLUMN_OUTPUTS = ('event_columns',)  # Typed int columns (event_codes.py), a few bytes per event, merged in game order
+LIST_SLOT_BYTES = 8 * 1.125  # A pointer per item plus CPython's list over-allocation
+
+# variant name -> (engine module, outputs its Multiplier script returns, whether end_mechanisms keeps every final event)
+VARIANTS = {
+    'simulations': ('simulations', OUTPUTS[:4], True),  # Multiplier.py
+    'FiveESimulations': ('FiveESimulations', OUTPUTS, False)  # FiveEMultiplier.py
+}
+
+_rules_cache = {}  # (variant, ruleset) -> rules, kept per process so workers parse each table once
+_measure_cache = {}  # (variant, ruleset) -> measure_game result, so budget checks sample each table once
+_rules_lock = threading.Lock()
+
+def load_engine(variant):
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown variant {variant!r}, expected one of {sorted(VARIANTS)}")
+    return importlib.import_module(VARIANTS[variant][0])
+
+def load_rules(variant, ruleset="DemonDiceTable4"):
+    """
+    Rules for a ruleset name (as passed to sim(), without .csv), parsed once per process.
+    A compiled {ruleset}.ddr (rule_compiler.py) is used instead of the CSV while it is up to date.
+    """
+    key = (variant, ruleset)
+    with _rules_lock:
+        if key not in _rules_cache:
+            engine = load_engine(variant)
+            rules = load_compiled_rules(ruleset) or engine.read_rules_from_csv(f"{ruleset}.csv", verbose=False)
+            if not rules:
+                raise ValueError(f"No rules could be loaded from {ruleset}.csv")
+            _rules_cache[key] = rules
+        return _rules_cache[key]
+
+def load_compiled_rules(ruleset):
+    """ Rules from {ruleset}.ddr, or None if there is none or its CSV has changed since compiling. """
+    from rule_compiler import load_compiled, COMPILED_EXTENSION
+    path = f"{ruleset}{COMPILED_EXTENSION}"
+    if not os.path.exists(path):
+        return None
+    return load_compiled(path, f"{ruleset}.csv" if os.path.exists(f"{ruleset}.csv") else None)
+
+def load_rule_rows(variant, ruleset="DemonDiceTable4"):
+    """
+    A ruleset's numeric rows (rule_compiler.ROW_FIELDS) for array code. Mapped straight from
+    an up-to-date {ruleset}.ddr without building rule dicts, else converted from load_rules.
+    """
+    from rule_compiler import load_compiled_rows, rule_rows, COMPILED_EXTENSION
+    path = f"{ruleset}{COMPILED_EXTENSION}"
+    if os.path.exists(path):
+        rows = load_compiled_rows(path, f"{ruleset}.csv" if os.path.exists(f"{ruleset}.csv") else None)
+        if rows is not None:
+            return rows
+    return rule_rows(load_rules(variant, ruleset))
+
+def new_aggregates():
+    return {name: [] for name in OUTPUTS}
+
+def add_game(aggregates, simulation_log, f_count, outputs=OUTPUTS, all_events=False):
+    """ Fold one game into the aggregate lists, exactly as the Multiplier scripts build them. """
+    last_entry = simulation_log[-1]
+
+    if 'turns_list' in outputs:
+        aggregates['turns_list'].append(last_entry['turn'])
+    if 'fight_count' in outputs:
+        aggregates['fight_count'].append(f_count)
+
+    if 'end_mechanisms' in outputs:
+        if 'events' in last_entry and last_entry['events']:
+            if all_events:
+                aggregates['end_mechanisms'].extend(last_entry['events'])
+            else:
+                aggregates['end_mechanisms'].append(last_entry['events'][0])
+        else:
+            aggregates['end_mechanisms'].append('fault')
+
+    if 'first_end_turns' in outputs:
+        for entry in simulation_log:
+            if 'End' in entry['events']:
+                aggregates['first_end_turns'].append(entry['turn'])
+                break
+
+    if 'all_turns' in outputs or 'all_rolls' in outputs:
+        for i, entry in enumerate(simulation_log):
+            aggregates['all_turns'].append(i + 1)
+            aggregates['all_rolls'].append(entry['total_roll'])
+
+    if 'sim_logs' in outputs:
+        aggregates['sim_logs'].append(simulation_log)
+
+    if 'event_columns' in outputs:
+        from event_codes import add_game as add_event_columns
+        add_event_columns(aggregates['event_columns'], simulation_log)
+
+    if 'sketches' in outputs:
+        from sketches import add_game as add_sketch_game
+        add_sketch_game(aggregates['sketches'], simulation_log)
+
+    if 'occupancy' in outputs:
+        from occupancy import add_game as add_occupancy
+        add_occupancy(aggregates['occupancy'], simulation_log)
+
+def merge_aggregates(aggregates, other):
+    """ Append other's games after aggregates' games (chunks must be merged in game order). """
+    for name in OUTPUTS:
+        aggregates[name].extend(other[name])
+    if 'event_columns' in other:
+        from event_codes import merge_columns
+        if 'event_columns' in aggregates:
+            merge_columns(aggregates['event_columns'], other['event_columns'])
+        else:
+            aggregates['event_columns'] = other['event_columns']
+    if 'sketches' in other:
+        from sketches import merge_sketches
+        if 'sketches' in aggregates:
+            merge_sketches(aggregates['sketches'], other['sketches'])
+        else:
+            aggregates['sketches'] = other['sketches']
+    if 'occupancy' in other:
+        from occupancy import merge_occupancy
+        if 'occupancy' in aggregates:
+            merge_occupancy(aggregates['occupancy'], other['occupancy'])
+        else:
+            aggregates['occupancy'] = other['occupancy']
+    return aggregates
+
+def run_chunk(variant, ruleset, seed, start, count, outputs=None, mode='plain', damage_bands=None):
+    """
+    Play games start .. start+count-1 of a seeded run and return their aggregates.
+    Game i always uses game_stream(seed, i, mode) (game_rng(seed, i) for plain runs),
+    so chunks can run anywhere, in any order.
+    'sketches' in outputs adds aggregates['sketches'] (sketches.py); 'occupancy' adds
+    aggregates['occupancy'] (occupancy.py), also counted by damage so far when
+    damage_bands is given; 'event_columns' adds event_codes.py's int columns for
+    classify_games. All three are folded in game by game, without keeping logs.
+    """
+    engine = load_engine(variant)
+    rules = load_rules(variant, ruleset)
+    if outputs is None:
+        outputs = VARIANTS[variant][1]
+    all_events = VARIANTS[variant][2]
+
+    aggregates = new_aggregates()
+    if 'event_columns' in outputs:
+        from event_codes import new_columns
+        aggregates['event_columns'] = new_columns()
+    if 'sketches' in outputs:
+        from sketches import new_sketches
+        aggregates['sketches'] = new_sketches()
+    if 'occupancy' in outputs:
+        from occupancy import new_occupancy
+        aggregates['occupancy'] = new_occupancy(engine, damage_bands)
+    for i in range(start, start + count):
+        simulation_log, f_count = engine.sim(rng=game_stream(seed, i, mode), rules=rules, verbose=False)
+        add_game(aggregates, simulation_log, f_count, outputs, all_events)
+    if 'occupancy' in outputs:
+        from occupancy import flush
+        flush(aggregates['occupancy'])
+    return aggregates
+
+def run_threaded(variant, ruleset, num_simulations, seed, outputs=None, workers=None, chunk_size=1000, mode='plain',
+                 snapshot=None, snapshot_every=10000, damage_bands=None):
+    """
+    Seeded batch on a thread pool. Every game owns its generator and sim(verbose=False)
+    never touches sys.stdout, so chunks share nothing; on free-threaded CPython this
+    scales across cores without spawning or pickling. Same aggregates as one run_chunk.
+    snapshot: optional JSON file for dashboard.py, refreshed as chunks complete.
+    """
+    starts = range(0, num_simulations, chunk_size)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_chunk, variant, ruleset, seed, start, min(chunk_size, num_simulations - start), outputs, mode,
+                               damage_bands)
+                   for start in starts]
+        writer = SnapshotWriter(snapshot, num_simulations, snapshot_every, variant=variant, seed=seed) if snapshot else None
+        aggregates = new_aggregates()
+        for start, future in zip(starts, futures):  # In submission order, so games stay in index order
+            chunk = future.result()
+            merge_aggregates(aggregates, chunk)
+            if writer:
+                writer.chunk(chunk, min(chunk_size, num_simulations - start))
+    return aggregates
+
+def as_results(variant, aggregates):
+    """ Aggregates as the tuple the variant's run_multiple_simulations returns. """
+    return tuple(aggregates[name] for name in VARIANTS[variant][1])
+
+def save_checkpoint(path, state):
+    """ Atomically write a checkpoint (write to a temp file, then rename over the old one). """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path, **expected):
+    """ Read a checkpoint, refusing to resume one written for a different run configuration. """
+    with open(path, 'rb') as file:
+        state = pickle.load(file)
+    for key, value in expected.items():
+        if state.get(key) != value:
+            raise ValueError(f"Checkpoint {path} was written with {key}={state.get(key)!r}, not {value!r}")
+    return state
+
+def _deep_size(obj, seen):
+    """ Bytes held by obj and everything it references that was not already counted. """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(key, seen) + _deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_deep_size(item, seen) for item in obj)
+    return size
+
+def measure_game(variant, ruleset="DemonDiceTable4", sample=200, seed=0):
+    """ Mean turns, events and retained bytes of one full simulation log, from a small sample of games. """
+    logs = run_chunk(variant, ruleset, f"{seed}:measure", 0, sample, ['sim_logs'])['sim_logs']
+    seen = set(id(s) for s in ('Fight', 'Accelerate mode on', 'End', 'End Flags', 'TPK', '200 turns'))
+    seen.update(id(i) for i in range(-5, 257))  # Interned strings and small ints are shared, never per game
+    return {
+        'mean_turns': sum(len(log) for log in logs) / sample,
+        'mean_events': sum(len(entry['events']) for log in logs for entry in log) / sample,
+        'log_bytes': sum(_deep_size(log, seen) for log in logs) / sample
+    }
+
+def estimate_footprint(variant, num_simulations, outputs=None, ruleset="DemonDiceTable4", measured=None):
+    """
+    Retained memory (bytes) of a run that keeps `outputs` for num_simulations games,
+    per output and in total. Per-turn and log sizes come from measure_game (once per
+    variant and ruleset in a process) unless given.
+    """
+    if outputs is None:
+        outputs = VARIANTS[variant][1]
+    if measured is None:
+        if (variant, ruleset) not in _measure_cache:
+            _measure_cache[(variant, ruleset)] = measure_game(variant, ruleset)
+        measured = _measure_cache[(variant, ruleset)]
+    per_output = {}
+    for name in outputs:
+        if name in PER_GAME_OUTPUTS:
+            per_output[name] = LIST_SLOT_BYTES * num_simulations
+        elif name in PER_TURN_OUTPUTS:
+            per_output[name] = LIST_SLOT_BYTES * measured['mean_turns'] * num_simulations
+        elif name == 'sim_logs':
+            per_output[name] = (LIST_SLOT_BYTES + measured['log_bytes']) * num_simulations
+        elif name == 'event_columns':
+            per_output[name] = (7 * measured['mean_events'] + 2) * num_simulations  # 'I', 'H', 'B' per event; 'H' per game
+        elif name == 'sketches':
+            per_output[name] = 3 * 201 * 100  # At most ~200 distinct values per Counter, whatever the game count
+        elif name == 'occupancy':
+            engine = load_engine(variant)
+            num_pairs = len(engine.dice_chain) * (len(engine.dice_chain) + 1) // 2
+            per_output[name] = 8 * 201 * (2 * num_pairs + 8)  # Whatever the game count; 8 damage bands at most
+    return {'total': sum(per_output.values()), 'per_output': per_output, 'measured': measured}
+
+class SpilledList(Sequence):
+    """ One output of a spilled run, read back from its chunk files one chunk at a time. """
+    def __init__(self, name, paths, lengths):
+        self.name = name
+        self.paths = paths
+        self.lengths = lengths
+        self._cached = (None, None)
+
+    def _chunk(self, k):
+        if self._cached[0] != k:
+            with open(self.paths[k], 'rb') as file:
+                self._cached = (k, pickle.load(file)[self.name])
+        return self._cached[1]
+
+    def __len__(self):
+        return sum(self.lengths)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        for k, length in enumerate(self.lengths):
+            if index < length:
+                return self._chunk(k)[index]
+            index -= length
+        raise IndexError(f"{self.name} index out of range")
+
+    def __iter__(self):
+        for k in range(len(self.paths)):
+            yield from self._chunk(k)
+
+def run_budgeted(variant, ruleset, num_simulations, seed, outputs=None, memory_budget=None, spill_dir=None,
+                 chunk_size=10000, mode='plain', damage_bands=None, checkpoint=None, resume=False,
+                 snapshot=None, snapshot_every=10000):
+    """
+    Seeded batch that checks its estimated footprint against memory_budget (bytes) first:
+      in-memory  the estimate fits: plain aggregates, as run_chunk returns them
+      spill      over budget with spill_dir: every chunk's outputs go to a pickle file in
+                 spill_dir and the aggregates are SpilledList views over those files
+      stream     over budget without spill_dir: the cheapest requested outputs are kept while
+                 they fit the budget and the rest are dropped (plan's 'kept_outputs' and
+                 'dropped_outputs'); the plan's 'counts' hold the dashboard.py histograms
+    Requested ADDITIVE_OUTPUTS and COLUMN_OUTPUTS are always kept in memory, whatever the strategy.
+    checkpoint: optional index file rewritten after every chunk; what the chunk keeps in memory goes
+    to its own file next to it ({checkpoint}.games<first game>), so each checkpoint costs the same
+    however far the run is. resume=True continues from the index, reusing the spill files written.
+    snapshot: optional JSON file for dashboard.py, refreshed every snapshot_every games.
+    Returns (aggregates, plan); plan records the estimate and the strategy chosen.
+    """
+    if outputs is None:
+        outputs = VARIANTS[variant][1]
+    estimate = estimate_footprint(variant, num_simulations, outputs, ruleset)
+    if memory_budget is None or estimate['total'] <= memory_budget:
+        strategy = 'in-memory'
+    else:
+        strategy = 'spill' if spill_dir else 'stream'
+    plan = {'strategy': strategy, 'estimate': estimate['total'], 'per_output': estimate['per_output'],
+            'memory_budget': memory_budget}
+    print(f"Estimated {estimate['total'] / 2**20:.0f} MiB for {num_simulations} games"
+          + (f" (budget {memory_budget / 2**20:.0f} MiB)" if memory_budget else "") + f": running {strategy}")
+
+    if strategy == 'in-memory' and not checkpoint and not snapshot:
+        return run_chunk(variant, ruleset, seed, 0, num_simulations, outputs, mode, damage_bands), plan
+
+    counts = new_counts()
+    paths, lengths = [], {name: [] for name in OUTPUTS}
+    kept_outputs = [name for name in outputs if name in OUTPUTS] if strategy == 'in-memory' else []
+    if strategy == 'stream':
+        room = memory_budget - sum(size for name, size in estimate['per_output'].items() if name not in OUTPUTS)
+        for name in sorted(outputs, key=lambda name: estimate['per_output'].get(name, 0)):
+            if name in OUTPUTS and estimate['per_output'][name] <= room:
+                kept_outputs.append(name)
+                room -= estimate['per_output'][name]
+        plan['kept_outputs'] = kept_outputs
+        plan['dropped_outputs'] = [name for name in outputs if name in OUTPUTS and name not in kept_outputs]
+        print(f"Streaming: keeping {', '.join(kept_outputs) or 'no per-game lists'}; "
+              f"dropping {', '.join(plan['dropped_outputs'])}")
+    # The histograms need the per-game lists, so stream runs ask for them whatever outputs were
+    chunk_outputs = outputs if strategy != 'stream' else tuple(dict.fromkeys(
+        PER_GAME_OUTPUTS + PER_TURN_OUTPUTS + tuple(kept_outputs)
+        + tuple(name for name in ADDITIVE_OUTPUTS + COLUMN_OUTPUTS if name in outputs)))
+
+    # A checkpoint only resumes the same run, chunked and split between memory and files the same way
+    config = {'variant': variant, 'ruleset': ruleset, 'num_simulations': num_simulations, 'seed': seed,
+              'outputs': list(outputs), 'chunk_size': chunk_size, 'mode': mode, 'damage_bands': damage_bands,
+              'strategy': strategy, 'kept_outputs': kept_outputs}
+    kept = new_aggregates()
+    chunk_files = []
+    first_game = 0
+    if resume and checkpoint and os.path.exists(checkpoint):
+        state = load_checkpoint(checkpoint, **config)
+        chunk_files, paths, lengths, counts = state['chunk_files'], state['spill_files'], state['lengths'], state['counts']
+        for path in chunk_files:
+            merge_aggregates(kept, load_checkpoint(path))
+        first_game = state['next_game']
+        print(f"Resuming from game {first_game} of {num_simulations}")
+
+    if strategy == 'spill':
+        os.makedirs(spill_dir, exist_ok=True)
+    snapshot_written = first_game
+    for start in range(first_game, num_simulations, chunk_size):
+        count = min(chunk_size, num_simulations - start)
+        chunk = run_chunk(variant, ruleset, seed, start, count, chunk_outputs, mode, damage_bands)
+        add_aggregates(counts, chunk)
+        kept_chunk = new_aggregates()  # Count tables and event columns are small, so they are never spilled
+        for name in ADDITIVE_OUTPUTS + COLUMN_OUTPUTS:
+            if name in chunk:
+                kept_chunk[name] = chunk.pop(name)
+        for name in kept_outputs:
+            kept_chunk[name] = chunk[name]
+        if checkpoint:  # Before merging, which may adopt the chunk's count tables as the running ones
+            chunk_files.append(f"{checkpoint}.games{start:010d}")
+            save_checkpoint(chunk_files[-1], kept_chunk)
+        merge_aggregates(kept, kept_chunk)
+        if strategy == 'spill':
+            path = os.path.join(spill_dir, f"{variant}_seed{seed}_games{start:010d}.pkl")
+            save_checkpoint(path, chunk)
+            paths.append(path)
+            for name in OUTPUTS:
+                lengths[name].append(len(chunk[name]))
+        if checkpoint:
+            save_checkpoint(checkpoint, dict(config, next_game=start + count, chunk_files=chunk_files,
+                                             spill_files=paths, lengths=lengths, counts=counts))
+        if snapshot and (start + count - snapshot_written >= snapshot_every or start + count == num_simulations):
+            write_snapshot(snapshot, counts, start + count, num_simulations, variant=variant, seed=seed)
+            snapshot_written = start + count
+    plan['counts'] = counts
+
+    if strategy != 'spill':
+        return kept, plan
+    plan['spill_files'] = paths
+    kept.update({name: SpilledList(name, paths, lengths[name]) for name in OUTPUTS})
+    return kept, plan
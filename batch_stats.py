@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-game dice streams (seeded, antithetic or scrambled quasi-random), game summaries and confidence intervals.
+"""
+import math
+import random
+from statistics import mean, stdev
+
+Z_95 = 1.96  # Normal quantile for a two-sided 95% confidence interval
+STREAM_MODES = ('plain', 'antithetic', 'qmc')
+QMC_REPLICATES = 16  # Independent scrambles per quasi-random run; their spread gives the error bars
+QMC_TURNS = 8  # Turns whose two dice come from the quasi-random point
+QMC_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89)
+
+def game_rng(seed, index):
+    """
+    Return the dice stream for game `index` of a run seeded with `seed`.
+    Every game gets its own generator, so a game replays identically no matter
+    which engine, process or batch position it is run from.
+    """
+    return random.Random(f"{seed}:{index}")
+
+class UniformDice:
+    """
+    Dice stream that spends exactly one uniform per roll, so two games fed matching
+    uniforms stay aligned roll by roll even after their dice sizes drift apart.
+    The first uniforms come from `uniforms` (e.g. a quasi-random point), the rest from
+    `fallback`. mirror=True turns every roll r on a d(size) into size + 1 - r, the
+    die-roll form of u -> 1 - u.
+    """
+    def __init__(self, fallback, uniforms=(), mirror=False):
+        self.fallback = fallback
+        self.uniforms = list(uniforms)
+        self.used = 0
+        self.mirror = mirror
+
+    def random(self):
+        if self.used < len(self.uniforms):
+            u = self.uniforms[self.used]
+        else:
+            u = self.fallback.random()
+        self.used += 1
+        return u
+
+    def randint(self, a, b):
+        span = b - a + 1
+        roll = a + min(int(self.random() * span), span - 1)
+        return a + b - roll if self.mirror else roll
+
+def _scrambled_halton(seed, replicate, dimensions):
+    """ Per-dimension digit permutations (0 kept fixed) and a random shift for one QMC replicate. """
+    rng = random.Random(f"{seed}:qmc-scramble:{replicate}")
+    scramble = []
+    for base in QMC_PRIMES[:dimensions]:
+        digits = list(range(1, base))
+        rng.shuffle(digits)
+        scramble.append((base, [0] + digits, rng.random()))
+    return scramble
+
+def halton_point(index, scramble):
+    """ Point `index` of a scrambled Halton sequence; the random shift makes it uniform on [0, 1)^d. """
+    point = []
+    for base, permutation, shift in scramble:
+        value, scale, n = 0.0, 1.0 / base, index
+        while n:
+            n, digit = divmod(n, base)
+            value += permutation[digit] * scale
+            scale /= base
+        point.append((value + shift) % 1.0)
+    return point
+
+_scramble_cache = {}
+
+def game_stream(seed, index, mode='plain', replicates=QMC_REPLICATES, qmc_turns=QMC_TURNS):
+    """
+    Dice stream for game `index` under a variance-reduction mode.
+    plain:      game_rng(seed, index), exactly as before.
+    antithetic: games 2k and 2k+1 share stream k; the odd game rolls the mirror image.
+    qmc:        game i is point i // replicates of scrambled Halton replicate i % replicates,
+                which drives the two dice of the first qmc_turns turns; later rolls are pseudo-random.
+    """
+    if mode == 'plain':
+        return game_rng(seed, index)
+    if mode == 'antithetic':
+        return UniformDice(game_rng(f"{seed}:antithetic", index // 2), mirror=index % 2 == 1)
+    if mode == 'qmc':
+        dimensions = 2 * qmc_turns
+        if dimensions > len(QMC_PRIMES):
+            raise ValueError(f"qmc_turns can be at most {len(QMC_PRIMES) // 2}")
+        key = (seed, index % replicates, dimensions)
+        if key not in _scramble_cache:
+            _scramble_cache[key] = _scrambled_halton(seed, index % replicates, dimensions)
+        point = halton_point(index // replicates + 1, _scramble_cache[key])  # Skip the all-zero first point
+        return UniformDice(game_rng(f"{seed}:qmc", index), uniforms=point)
+    raise ValueError(f"Unknown stream mode {mode!r}, expected one of {STREAM_MODES}")
+
+def summarize_game(simulation_log, f_count):
+    """
+    Reduce one simulation log to the per-game numbers the Multiplier scripts plot:
+    turns lasted, end mechanism, fight count and first 'End' turn (None if never).
+    """
+    last_entry = simulation_log[-1]
+
+    if 'events' in last_entry and last_entry['events']:
+        end_mechanism = last_entry['events'][0]
+    else:
+        end_mechanism = 'fault'
+
+    first_end_turn = None
+    for entry in simulation_log:
+        if 'End' in entry['events']:
+            first_end_turn = entry['turn']
+            break
+
+    return {
+        'turns': last_entry['turn'],
+        'end_mechanism': end_mechanism,
+        'fight_count': f_count,
+        'first_end_turn': first_end_turn
+    }
+
+def mean_ci(values, z=Z_95):
+    """ Mean of values with its standard error and normal-approximation confidence interval. """
+    n = len(values)
+    m = mean(values)
+    se = stdev(values) / math.sqrt(n) if n > 1 else 0.0
+    return {'mean': m, 'se': se, 'low': m - z * se, 'high': m + z * se, 'n': n}
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Live dashboard for long batch runs. The runner keeps running counts of what the
+Multiplier plots show (turns lasted, end mechanisms, first 'End' turns, fights and
+the luck heatmap's turn/total-roll counts) and writes them to a small JSON snapshot
+every so often. A headless renderer turns snapshots into PNGs, redrawing only the
+panels whose counts changed, plus a static HTML page that reloads itself:
+
+    python FiveEMultiplier.py ...          (run_multiple_simulations(..., snapshot="run.json"))
+    python dashboard.py run.json --out dashboard/ --watch
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+from collections import Counter
+
+PANELS = ('turns', 'first_end_turns', 'end_mechanisms', 'fight_count', 'heatmap')
+
+def new_counts():
+    return {name: Counter() for name in PANELS}
+
+def add_game(counts, simulation_log, f_count):
+    """ Fold one game into the running counts, matching what FiveEMultiplier collects. """
+    last_entry = simulation_log[-1]
+    counts['turns'][last_entry['turn']] += 1
+    counts['fight_count'][f_count] += 1
+    if 'events' in last_entry and last_entry['events']:
+        counts['end_mechanisms'][last_entry['events'][0]] += 1
+    else:
+        counts['end_mechanisms']['fault'] += 1
+    for entry in simulation_log:
+        if 'End' in entry['events']:
+            counts['first_end_turns'][entry['turn']] += 1
+            break
+    for i, entry in enumerate(simulation_log):
+        counts['heatmap'][(i + 1, entry['total_roll'])] += 1
+
+def add_aggregates(counts, aggregates):
+    """ Fold a batch_runner chunk into the running counts; panels whose outputs were not requested stay empty. """
+    counts['turns'].update(aggregates['turns_list'])
+    counts['fight_count'].update(aggregates['fight_count'])
+    counts['end_mechanisms'].update(aggregates['end_mechanisms'])
+    counts['first_end_turns'].update(aggregates['first_end_turns'])
+    counts['heatmap'].update(zip(aggregates['all_turns'], aggregates['all_rolls']))
+
+def _encode(counter):
+    return [[list(key) if isinstance(key, tuple) else key, value] for key, value in sorted(counter.items(), key=str)]
+
+def write_snapshot(path, counts, games_done, num_simulations, **meta):
+    """ Atomically write the running counts; readers never see a half-written file. """
+    snapshot = {
+        'games_done': games_done,
+        'num_simulations': num_simulations,
+        'finished': games_done >= num_simulations,
+        'written_at': time.time(),
+        'meta': meta,
+        'counts': {name: _encode(counts[name]) for name in PANELS}
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(snapshot, file)
+    os.replace(tmp_path, path)
+
+def read_snapshot(path):
+    with open(path) as file:
+        snapshot = json.load(file)
+    snapshot['counts'] = {name: Counter({tuple(key) if isinstance(key, list) else key: value
+                                         for key, value in snapshot['counts'][name]}) for name in PANELS}
+    return snapshot
+
+class SnapshotWriter:
+    """ Calls write_snapshot every `every` games; used by the batch loops. """
+    def __init__(self, path, num_simulations, every=1000, **meta):
+        self.path = path
+        self.num_simulations = num_simulations
+        self.every = every
+        self.meta = meta
+        self.counts = new_counts()
+        self.games = 0
+        self.last_written = 0
+
+    def game(self, simulation_log, f_count):
+        add_game(self.counts, simulation_log, f_count)
+        self.games += 1
+        self.maybe_write()
+
+    def chunk(self, aggregates, games):
+        add_aggregates(self.counts, aggregates)
+        self.games += games
+        self.maybe_write()
+
+    def maybe_write(self, force=False):
+        if force or self.games - self.last_written >= self.every or self.games >= self.num_simulations:
+            write_snapshot(self.path, self.counts, self.games, self.num_simulations, **self.meta)
+            self.last_written = self.games
+
+def _draw_panel(name, counter, games_done):
+    """ One panel as its own figure, drawn without pyplot so no display is ever needed. """
+    from matplotlib.figure import Figure
+    import numpy as np
+
+    fig = Figure(figsize=(14, 7) if name == 'heatmap' else (10, 5))
+    ax = fig.add_subplot()
+    if not counter:
+        ax.text(0.5, 0.5, 'No data yet', ha='center', va='center')
+    elif name == 'heatmap':
+        turns = [turn for turn, _ in counter]
+        rolls = [roll for _, roll in counter]
+        xedges = np.arange(min(turns), max(turns) + 2)
+        yedges = np.arange(min(rolls), max(rolls) + 2)
+        H = np.zeros((len(yedges) - 1, len(xedges) - 1))
+        for (turn, roll), count in counter.items():
+            H[roll - yedges[0], turn - xedges[0]] = count
+        mesh = ax.pcolormesh(xedges, yedges, H, cmap='plasma', vmin=0, vmax=H.max())
+        fig.colorbar(mesh, ax=ax, label='Frequency')
+        ax.set_xlabel('Turn Number')
+        ax.set_ylabel('Total Roll')
+        ax.grid(True, linestyle='--', alpha=0.3)
+    elif name == 'end_mechanisms':
+        ax.bar(list(counter.keys()), list(counter.values()), color='orange', alpha=0.7)
+        ax.set_xlabel('Mechanism')
+    else:
+        values = sorted(counter)
+        ax.bar(values, [counter[v] for v in values], width=1.0 if name != 'fight_count' else 0.8,
+               color='blue' if name == 'turns' else 'teal', alpha=0.7,
+               edgecolor='black' if name != 'fight_count' else None)
+        ax.set_xlabel({'turns': 'Number of Turns', 'first_end_turns': 'Turn', 'fight_count': 'Fights'}[name])
+    if name != 'heatmap':
+        ax.set_ylabel('Count')
+    titles = {
+        'turns': 'Histogram of Turns Lasted in Demon Dice Simulation',
+        'first_end_turns': 'Histogram of First Turn that an "End" is rolled',
+        'end_mechanisms': 'End Mechanism Triggers',
+        'fight_count': 'Number of Fights Triggered',
+        'heatmap': 'Total Rolls Over Time (All Simulations)'
+    }
+    ax.set_title(f"{titles[name]} ({games_done} games)")
+    fig.tight_layout()
+    return fig
+
+def render_snapshot(snapshot_path, out_dir='dashboard', html=True, dpi=100):
+    """
+    Render a snapshot into out_dir, redrawing only panels whose counts changed since the
+    last render (tracked by a hash per panel). Returns the list of panels redrawn.
+    """
+    snapshot = read_snapshot(snapshot_path)
+    os.makedirs(out_dir, exist_ok=True)
+    state_path = os.path.join(out_dir, 'dashboard_state.json')
+    state = {}
+    if os.path.exists(state_path):
+        with open(state_path) as file:
+            state = json.load(file)
+
+    redrawn = []
+    for name in PANELS:
+        digest = hashlib.sha256(json.dumps(_encode(snapshot['counts'][name])).encode()).hexdigest()
+        png_path = os.path.join(out_dir, f"{name}.png")
+        if state.get(name) == digest and os.path.exists(png_path):
+            continue
+        fig = _draw_panel(name, snapshot['counts'][name], snapshot['games_done'])
+        fig.savefig(f"{png_path}.tmp.png", dpi=dpi)
+        os.replace(f"{png_path}.tmp.png", png_path)
+        state[name] = digest
+        redrawn.append(name)
+
+    with open(state_path, 'w') as file:
+        json.dump(state, file)
+    if html:
+        write_html(os.path.join(out_dir, 'index.html'), snapshot)
+    return redrawn
+
+def write_html(path, snapshot, refresh_seconds=10):
+    """ Static page showing every panel; reloads itself until the run has finished. """
+    done, total = snapshot['games_done'], snapshot['num_simulations']
+    refresh = '' if snapshot['finished'] else f'<meta http-equiv="refresh" content="{refresh_seconds}">'
+    stamp = int(snapshot['written_at'])  # Cache-busts the images when they change
+    images = "\n".join(f'<img src="{name}.png?{stamp}" style="max-width:100%"><br>' for name in PANELS)
+    with open(path, 'w') as file:
+        file.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">{refresh}<title>Demon Dice run</title></head>\n"
+                   f"<body><h2>{done} / {total} games ({100 * done / max(total, 1):.1f}%)</h2>\n{images}\n</body></html>\n")
+
+def watch(snapshot_path, out_dir='dashboard', poll_seconds=5.0, html=True):
+    """ Re-render whenever the snapshot file changes; returns once the run reports finished. """
+    last_mtime = None
+    while True:
+        if os.path.exists(snapshot_path):
+            mtime = os.path.getmtime(snapshot_path)
+            if mtime != last_mtime:
+                last_mtime = mtime
+                redrawn = render_snapshot(snapshot_path, out_dir, html)
+                snapshot = read_snapshot(snapshot_path)
+                print(f"{snapshot['games_done']}/{snapshot['num_simulations']} games, redrew {redrawn or 'nothing'}")
+                if snapshot['finished']:
+                    return
+        time.sleep(poll_seconds)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render batch-run snapshots to PNGs and an HTML page")
+    parser.add_argument('snapshot')
+    parser.add_argument('--out', default='dashboard')
+    parser.add_argument('--watch', action='store_true', help="Keep re-rendering until the run finishes")
+    parser.add_argument('--poll', type=float, default=5.0)
+    parser.add_argument('--no-html', action='store_true')
+    args = parser.parse_args()
+
+    if args.watch:
+        watch(args.snapshot, args.out, args.poll, not args.no_html)
+    else:
+        print(f"Redrew {render_snapshot(args.snapshot, args.out, not args.no_html) or 'nothing'}")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+One command-line entry point for shell pipelines. Each subcommand imports only
+what it needs (NumPy and matplotlib only for exact and plot), never opens a
+window, and writes JSON to stdout (batch can also write a pickle of its aggregates):
+
+    python demon_dice.py simulate --seed 7 --game 3 --log
+    python demon_dice.py batch --games 100000 --seed 7 --workers 8 > summary.json
+    python demon_dice.py batch --games 100000 --seed 7 --format pickle > run.pkl
+    python demon_dice.py exact --variant simulations --tolerance 1e-6
+    python demon_dice.py sweep --rulesets DemonDiceTable4 DemonDiceTable4_search1 --games 20000
+    python demon_dice.py plot run.pkl --out plots/
+"""
+import sys
+import json
+import argparse
+from collections import Counter
+
+VARIANT_NAMES = ('simulations', 'FiveESimulations')  # Kept here so --help does not import batch_runner
+
+def game_record(simulation_log, f_count, include_log=False):
+    from batch_stats import summarize_game
+    record = summarize_game(simulation_log, f_count)
+    if include_log:
+        record['log'] = simulation_log
+    return record
+
+def batch_summary(aggregates, num_simulations):
+    """ JSON-ready summary of a batch's aggregates. """
+    from batch_stats import mean_ci
+    from sketches import quantile
+
+    turns = Counter(aggregates['turns_list'])
+    summary = {
+        'games': num_simulations,
+        'turns': mean_ci(aggregates['turns_list']),
+        'turns_quantiles': {q: quantile(turns, q) for q in (0.5, 0.9, 0.99)},
+        'turns_histogram': dict(sorted(turns.items())),
+        'end_mechanisms': dict(Counter(aggregates['end_mechanisms'])),
+        'fight_count': dict(sorted(Counter(aggregates['fight_count']).items())),
+        'games_with_end': len(aggregates['first_end_turns'])
+    }
+    if len(aggregates['first_end_turns']) > 1:
+        summary['first_end_turn'] = mean_ci(aggregates['first_end_turns'])
+    return summary
+
+def run_batch(args, ruleset):
+    from batch_runner import run_chunk, run_threaded
+    outputs = None if args.full else ['turns_list', 'end_mechanisms', 'fight_count', 'first_end_turns']
+    if args.workers > 1:
+        return run_threaded(args.variant, ruleset, args.games, args.seed, outputs, args.workers, args.chunk_size, args.mode)
+    return run_chunk(args.variant, ruleset, args.seed, 0, args.games, outputs, args.mode)
+
+def cmd_simulate(args):
+    import importlib
+    from batch_stats import game_rng
+    engine = importlib.import_module(args.variant)  # Not via batch_runner: one game needs none of its imports
+    rules = engine.read_rules_from_csv(f"{args.ruleset}.csv", verbose=False)
+    if not rules:
+        raise SystemExit(f"No rules could be loaded from {args.ruleset}.csv")
+    games = []
+    for i in range(args.game, args.game + args.games):
+        rng = game_rng(args.seed, i) if args.seed is not None else None
+        simulation_log, f_count = engine.sim(rng=rng, rules=rules, verbose=False)
+        games.append(dict(game_record(simulation_log, f_count, args.log), game=i))
+    return {'variant': args.variant, 'ruleset': args.ruleset, 'seed': args.seed, 'games': games}
+
+def cmd_batch(args):
+    aggregates = run_batch(args, args.ruleset)
+    if args.format == 'pickle':
+        return {'variant': args.variant, 'ruleset': args.ruleset, 'seed': args.seed, 'mode': args.mode,
+                'num_simulations': args.games, 'aggregates': aggregates}
+    result = {'variant': args.variant, 'ruleset': args.ruleset, 'seed': args.seed, 'mode': args.mode,
+              'summary': batch_summary(aggregates, args.games)}
+    if args.full:
+        result['aggregates'] = aggregates
+    return result
+
+def cmd_exact(args):
+    from batch_runner import load_engine, load_rules
+    from exact import exact_distributions
+    result = exact_distributions(load_engine(args.variant), rules=load_rules(args.variant, args.ruleset),
+                                 max_turns=args.max_turns, tolerance=args.tolerance)
+    return {'variant': args.variant, 'ruleset': args.ruleset, **result}
+
+def cmd_sweep(args):
+    rows = []
+    for ruleset in args.rulesets:
+        aggregates = run_batch(args, ruleset)
+        rows.append({'ruleset': ruleset, **batch_summary(aggregates, args.games)})
+    return {'variant': args.variant, 'seed': args.seed, 'mode': args.mode, 'rulesets': rows}
+
+def cmd_plot(args):
+    """ Render a batch pickle (from batch --format pickle) or a run snapshot JSON to PNGs. """
+    import os
+    import pickle
+    from dashboard import new_counts, add_aggregates, write_snapshot, render_snapshot
+
+    snapshot_path = args.input
+    if not args.input.endswith('.json'):
+        with open(args.input, 'rb') as file:
+            run = pickle.load(file)
+        counts = new_counts()
+        add_aggregates(counts, run['aggregates'])
+        os.makedirs(args.out, exist_ok=True)
+        snapshot_path = os.path.join(args.out, 'snapshot.json')
+        write_snapshot(snapshot_path, counts, run['num_simulations'], run['num_simulations'],
+                       variant=run['variant'], seed=run['seed'])
+    return {'out': args.out, 'redrawn': render_snapshot(snapshot_path, args.out, html=not args.no_html)}
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Demon Dice simulations from the command line (JSON on stdout)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def common(sub, ruleset=True):
+        sub.add_argument('--variant', default='FiveESimulations', choices=VARIANT_NAMES)
+        if ruleset:
+            sub.add_argument('--ruleset', default='DemonDiceTable4', help="CSV name without .csv")
+        sub.add_argument('--pretty', action='store_true', help="Indent the JSON")
+
+    def batch_options(sub):
+        sub.add_argument('--games', type=int, default=1000)
+        sub.add_argument('--seed', type=int, default=0)
+        sub.add_argument('--mode', default='plain', choices=('plain', 'antithetic', 'qmc'))
+        sub.add_argument('--workers', type=int, default=1, help="Threads; more than 1 uses run_threaded")
+        sub.add_argument('--chunk-size', type=int, default=1000)
+        sub.add_argument('--full', action='store_true', help="Keep every output list, not just the summary")
+
+    simulate = commands.add_parser('simulate', help="Play single games")
+    common(simulate)
+    simulate.add_argument('--seed', type=int, default=None, help="Replay game_rng(seed, game); unseeded if left out")
+    simulate.add_argument('--game', type=int, default=0, help="Index of the first game")
+    simulate.add_argument('--games', type=int, default=1)
+    simulate.add_argument('--log', action='store_true', help="Include the full per-turn log")
+
+    batch = commands.add_parser('batch', help="Seeded batch, summarised")
+    common(batch)
+    batch_options(batch)
+    batch.add_argument('--format', default='json', choices=('json', 'pickle'))
+
+    exact = commands.add_parser('exact', help="Exact distributions (NumPy)")
+    common(exact)
+    exact.add_argument('--tolerance', type=float, default=0.0)
+    exact.add_argument('--max-turns', type=int, default=200)
+
+    sweep = commands.add_parser('sweep', help="The same seeded batch over several rule tables")
+    common(sweep, ruleset=False)
+    sweep.add_argument('--rulesets', nargs='+', required=True)
+    batch_options(sweep)
+
+    plot = commands.add_parser('plot', help="Headless PNGs from a batch pickle or snapshot JSON (matplotlib)")
+    plot.add_argument('input')
+    plot.add_argument('--out', default='plots')
+    plot.add_argument('--no-html', action='store_true')
+    plot.add_argument('--pretty', action='store_true')
+    return parser
+
+COMMANDS = {'simulate': cmd_simulate, 'batch': cmd_batch, 'exact': cmd_exact, 'sweep': cmd_sweep, 'plot': cmd_plot}
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    result = COMMANDS[args.command](args)
+    try:
+        if getattr(args, 'format', 'json') == 'pickle':
+            import pickle
+            pickle.dump(result, sys.stdout.buffer, protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            json.dump(result, sys.stdout, indent=2 if args.pretty else None, default=float)
+            sys.stdout.write("\n")
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # Reader (e.g. head) went away; don't let the interpreter complain on exit
+        import os
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Automated rule-table design. Searches die_size_change, damage and event_flag
+values inside designer-given bounds for a table that hits target game lengths,
+scoring every candidate with a small common-random-numbers batch (or the exact
+solver) and writing the best tables back out as CSV in the DemonDiceTable format.
+"""
+import csv
+import random
+from statistics import median, mean
+from concurrent.futures import ProcessPoolExecutor
+from batch_stats import game_rng, summarize_game
+from batch_runner import load_engine, load_rules
+
+FLAGS = ('', 'Fight', 'Accelerate', 'End', 'Once')
+
+# What the designers are aiming for
+DEFAULT_TARGETS = {
+    'median_turns': 25,
+    'max_tpk': 0.01,
+    'mean_fights': 2.0
+}
+
+def write_rules_to_csv(rules, file_name):
+    """ Write rules in the same 4-column layout read_rules_from_csv expects (zeros left blank). """
+    with open(file_name, mode='w', newline='') as file:
+        csv_writer = csv.writer(file)
+        for rule in rules:
+            csv_writer.writerow([
+                rule['flavor_text'],
+                rule['die_size_change'] or '',
+                rule['damage'] or '',
+                rule['event_flag']
+            ])
+
+def default_bounds(rules, die_range=1, damage_range=5, rows=None, flags=False):
+    """
+    Bounds that let each chosen row (default: all) move die_size_change by +-die_range
+    and damage by +-damage_range around its current value. flags=True also lets the
+    search pick any event flag for those rows.
+    Returns {row_index: {'die_size_change': (lo, hi), 'damage': (lo, hi), 'event_flag': [...]}}.
+    """
+    bounds = {}
+    for i in (range(len(rules)) if rows is None else rows):
+        rule = rules[i]
+        bounds[i] = {
+            'die_size_change': (rule['die_size_change'] - die_range, rule['die_size_change'] + die_range),
+            'damage': (max(min(0, rule['damage']), rule['damage'] - damage_range), rule['damage'] + damage_range),
+            'event_flag': list(FLAGS) if flags else [rule['event_flag']]
+        }
+    return bounds
+
+def table_key(rules):
+    """ Hashable key for the parts of a table the game depends on (flavor text is ignored). """
+    return tuple((rule['die_size_change'], rule['damage'], rule['event_flag']) for rule in rules)
+
+def evaluate_table(variant, rules, num_games=400, seed=0):
+    """
+    Metrics of a table from a small batch on fixed dice streams. Every candidate sees
+    the same streams, so differences between candidates are not sampling noise.
+    """
+    engine = load_engine(variant)
+    games = []
+    for i in range(num_games):
+        simulation_log, f_count = engine.sim(rng=game_rng(seed, i), rules=rules, verbose=False)
+        games.append(summarize_game(simulation_log, f_count))
+
+    return {
+        'median_turns': median(g['turns'] for g in games),
+        'tpk': sum(1 for g in games if g['end_mechanism'] == 'TPK') / num_games,
+        'mean_fights': mean(g['fight_count'] for g in games)
+    }
+
+def evaluate_table_exact(variant, rules, tolerance=1e-6):
+    """ The same metrics from the exact solver (slower per table, but no sampling error at all). """
+    from exact import exact_distributions
+    result = exact_distributions(load_engine(variant), rules=rules, tolerance=tolerance)
+
+    cumulative = 0.0
+    median_turns = len(result['length']) - 1
+    for turn, p in enumerate(result['length']):
+        cumulative += p
+        if cumulative >= 0.5:
+            median_turns = turn
+            break
+
+    return {
+        'median_turns': median_turns,
+        'tpk': result['end_mechanisms']['TPK'],
+        'mean_fights': sum(k * p for k, p in result['fight_count'].items())
+    }
+
+def score(metrics, targets=DEFAULT_TARGETS):
+    """ Lower is better: distance from the median and fight targets plus a steep P(TPK) penalty. """
+    return (abs(metrics['median_turns'] - targets['median_turns']) / targets['median_turns']
+            + abs(metrics['mean_fights'] - targets['mean_fights']) / max(targets['mean_fights'], 1)
+            + 20 * max(0.0, metrics['tpk'] - targets['max_tpk']))
+
+def _evaluate(args):
+    variant, rules, num_games, seed, exact = args
+    if exact:
+        return evaluate_table_exact(variant, rules)
+    return evaluate_table(variant, rules, num_games, seed)
+
+def mutate(rules, bounds, rng, changes=1):
+    """ Copy of rules with `changes` random cells moved within bounds. """
+    new_rules = [dict(rule) for rule in rules]
+    rows = list(bounds)
+    for _ in range(changes):
+        i = rng.choice(rows)
+        column = rng.choice(['die_size_change', 'damage', 'event_flag'])
+        if column == 'event_flag':
+            new_rules[i]['event_flag'] = rng.choice(bounds[i]['event_flag'])
+        else:
+            lo, hi = bounds[i][column]
+            new_rules[i][column] = rng.randint(lo, hi)
+    return new_rules
+
+def search_tables(variant='FiveESimulations', ruleset='DemonDiceTable4', bounds=None, targets=DEFAULT_TARGETS,
+                  generations=30, population=8, children=4, num_games=400, seed=0, search_seed=0,
+                  exact=False, workers=None):
+    """
+    (mu + lambda) evolutionary search. Each generation every kept table gets `children`
+    mutants; all tables are scored (cached by table contents, in parallel) and the best
+    `population` survive. Returns [(score, metrics, rules)] best first.
+    """
+    base_rules = load_rules(variant, ruleset)
+    if bounds is None:
+        bounds = default_bounds(base_rules)
+    rng = random.Random(search_seed)
+    cache = {}
+
+    def evaluate_all(tables, pool):
+        todo = {}
+        for rules in tables:
+            key = table_key(rules)
+            if key not in cache and key not in todo:
+                todo[key] = rules
+        jobs = [(variant, rules, num_games, seed, exact) for rules in todo.values()]
+        for key, metrics in zip(todo, pool.map(_evaluate, jobs)):
+            cache[key] = (score(metrics, targets), metrics)
+        return [(cache[table_key(rules)][0], cache[table_key(rules)][1], rules) for rules in tables]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        ranked = evaluate_all([base_rules], pool)
+        for generation in range(generations):
+            candidates = [rules for _, _, rules in ranked]
+            for _, _, rules in ranked:
+                for _ in range(children):
+                    candidates.append(mutate(rules, bounds, rng, changes=rng.randint(1, 3)))
+
+            scored = evaluate_all(candidates, pool)
+            unique = {}
+            for entry in sorted(scored, key=lambda entry: entry[0]):
+                unique.setdefault(table_key(entry[2]), entry)
+            ranked = list(unique.values())[:population]
+
+            best_score, best_metrics, _ = ranked[0]
+            print(f"Generation {generation + 1}: best score {best_score:.4f} {best_metrics} ({len(cache)} tables evaluated)")
+
+    return ranked
+
+# Main execution block
+if __name__ == "__main__":
+    best = search_tables(generations=20, num_games=300, seed=2024)
+    for rank, (table_score, metrics, rules) in enumerate(best[:3], start=1):
+        file_name = f"DemonDiceTable4_search{rank}.csv"
+        write_rules_to_csv(rules, file_name)
+        print(f"{file_name}: score {table_score:.4f} {metrics}")
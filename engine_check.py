@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regression harness for the game engines. Plays a batch with each engine and tests
+it against a reference with proper statistical tests: the exact solver where it
+can run, otherwise another engine's batch. Checked are game length, end-mechanism
+shares, first 'End' turn, mean turns and the dice pair occupied at several turns.
+
+All tests share one family-wise false-alarm rate (Bonferroni), so a correct engine
+fails a full run with probability at most `alpha`:
+
+    python engine_check.py --variant FiveESimulations --games 20000
+    python engine_check.py --engines multiplexed --reference loop --games 50000
+"""
+import os
+import sys
+import math
+import pickle
+import argparse
+import numpy as np
+from batch_stats import game_rng, summarize_game
+from batch_runner import load_engine, load_rules, load_rule_rows
+from occupancy import new_occupancy, add_game as add_occupancy, flush
+
+END_MECHANISMS = ('TPK', 'End Flags', '200 turns')
+OCCUPANCY_TURNS = (5, 10, 20, 40, 60, 80)  # Turns whose dice-pair occupancy is tested
+MAX_TURNS = 200
+MIN_EXPECTED = 5  # Chi-square bins are pooled until each expects at least this many games
+
+def _gamma_q(a, x):
+    """ Regularized upper incomplete gamma Q(a, x) (series below a + 1, continued fraction above). """
+    if x <= 0:
+        return 1.0
+    log_front = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        term = total = 1.0 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return max(0.0, 1.0 - total * math.exp(log_front))
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 10000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        h *= d * c
+        if abs(d * c - 1) < 1e-15:
+            break
+    return math.exp(log_front) * h
+
+def chi2_sf(stat, df):
+    """ P(chi-square with df degrees of freedom >= stat). """
+    return _gamma_q(df / 2, stat / 2)
+
+def normal_sf(z):
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+def _pool(observed, expected):
+    """ Merge neighbouring bins until every bin expects MIN_EXPECTED; returns pooled (observed, expected). """
+    pooled_o, pooled_e = [], []
+    o_run = e_run = 0.0
+    for o, e in zip(observed, expected):
+        o_run += o
+        e_run += e
+        if e_run >= MIN_EXPECTED:
+            pooled_o.append(o_run)
+            pooled_e.append(e_run)
+            o_run = e_run = 0.0
+    if pooled_o:
+        pooled_o[-1] += o_run
+        pooled_e[-1] += e_run
+    return pooled_o, pooled_e
+
+def chi_square_gof(observed, probabilities):
+    """ Goodness of fit of counts to reference probabilities (same bin order). Returns (stat, df, p). """
+    observed = np.asarray(observed, dtype=float)
+    probabilities = np.asarray(probabilities, dtype=float)
+    if (observed[probabilities <= 0] > 0).any():
+        return math.inf, 0, 0.0  # Something the reference says cannot happen did happen
+    total = observed.sum()
+    pooled_o, pooled_e = _pool(observed, probabilities / probabilities.sum() * total)
+    if len(pooled_o) < 2:
+        return 0.0, 0, 1.0
+    stat = sum((o - e) ** 2 / e for o, e in zip(pooled_o, pooled_e))
+    df = len(pooled_o) - 1
+    return stat, df, chi2_sf(stat, df)
+
+def chi_square_two_sample(counts_a, counts_b):
+    """ Test that two count vectors over the same bins come from one distribution. Returns (stat, df, p). """
+    a = np.asarray(counts_a, dtype=float)
+    b = np.asarray(counts_b, dtype=float)
+    n_a, n_b = a.sum(), b.sum()
+    pooled = []
+    run_a = run_b = 0.0
+    for x, y in zip(a, b):
+        run_a += x
+        run_b += y
+        if (run_a + run_b) * min(n_a, n_b) / (n_a + n_b) >= MIN_EXPECTED:
+            pooled.append((run_a, run_b))
+            run_a = run_b = 0.0
+    if pooled:
+        pooled[-1] = (pooled[-1][0] + run_a, pooled[-1][1] + run_b)
+    if len(pooled) < 2:
+        return 0.0, 0, 1.0
+    stat = 0.0
+    for x, y in pooled:
+        column = x + y
+        for observed, n in ((x, n_a), (y, n_b)):
+            expected = column * n / (n_a + n_b)
+            stat += (observed - expected) ** 2 / expected
+    df = len(pooled) - 1
+    return stat, df, chi2_sf(stat, df)
+
+def play_loop(variant, ruleset, num_games, seed):
+    """ The reference engine: sim() one game at a time on game_rng streams, logs folded and dropped. """
+    engine = load_engine(variant)
+    rules = load_rules(variant, ruleset)
+    occupancy = new_occupancy(engine)
+    turns, ends, first_ends = [], [], []
+    for i in range(num_games):
+        simulation_log, f_count = engine.sim(rng=game_rng(seed, i), rules=rules, verbose=False)
+        summary = summarize_game(simulation_log, f_count)
+        turns.append(summary['turns'])
+        ends.append(summary['end_mechanism'])
+        first_ends.append(summary['first_end_turn'] or 0)
+        add_occupancy(occupancy, simulation_log)
+    return {'turns': np.array(turns), 'end_mechanisms': ends, 'first_end': np.array(first_ends),
+            'occupancy': flush(occupancy)['counts'].sum(axis=2)}
+
+def play_multiplexed_engine(variant, ruleset, num_games, seed):
+    from multiplexed import play_multiplexed, END_NAMES
+    played = play_multiplexed(variant, [load_rule_rows(variant, ruleset)], np.zeros(num_games, dtype=np.int64),
+                              np.random.default_rng(seed), occupancy=True)
+    return {'turns': played['turns'], 'end_mechanisms': [END_NAMES[e] for e in played['end']],
+            'first_end': played['first_end'], 'occupancy': played['occupancy'][0]}
+
+# Engine name -> function(variant, ruleset, num_games, seed) returning the sample dict above
+ENGINES = {
+    'loop': play_loop,
+    'multiplexed': play_multiplexed_engine
+}
+
+def exact_reference(variant, ruleset, cache=None, tolerance=0.0):
+    """
+    Exact distributions (with occupancy) for a table, optionally cached in a pickle file.
+    The full solve (tolerance=0) is the default; with a tolerance, tests_against_exact
+    pools the turns the solve did not reach into one tail bin.
+    """
+    if cache and os.path.exists(cache):
+        with open(cache, 'rb') as file:
+            stored = pickle.load(file)
+        if stored['key'] == (variant, load_rules(variant, ruleset), tolerance):
+            return stored['reference']
+    from exact import exact_distributions
+    reference = exact_distributions(load_engine(variant), rules=load_rules(variant, ruleset), tolerance=tolerance,
+                                    occupancy=True)
+    if cache:
+        with open(cache, 'wb') as file:
+            pickle.dump({'key': (variant, load_rules(variant, ruleset), tolerance), 'reference': reference}, file)
+    return reference
+
+def _histogram(values, size):
+    return np.bincount(np.asarray(values, dtype=np.int64), minlength=size)[:size]
+
+def _end_counts(sample, stop=MAX_TURNS):
+    """ Games ending by each mechanism (and any other, e.g. 'fault', last), counting games that end by `stop`. """
+    ends = [e for e, turns in zip(sample['end_mechanisms'], sample['turns']) if turns <= stop]
+    return [sum(1 for e in ends if e == name) for name in END_MECHANISMS] + \
+           [sum(1 for e in ends if e not in END_MECHANISMS)]
+
+def tests_against_exact(sample, reference):
+    """ [(name, p-value)] for one engine's sample against exact distributions. """
+    unresolved = reference['unresolved']
+    results = []
+
+    # A solve stopped early by its tolerance knows nothing about turns after `stop`, only
+    # their total mass `unresolved`: those turns are pooled into one tail bin carrying it,
+    # and end mechanisms and mean turns are compared over the games that end by `stop`
+    stop = MAX_TURNS
+    if unresolved > 0:
+        stop = max(turn for turn, p in enumerate(reference['survival']) if p > 0)
+
+    turns = _histogram(sample['turns'], MAX_TURNS + 1)
+    observed = list(turns[:stop + 1]) + [turns[stop + 1:].sum()]
+    length = list(reference['length'][:stop + 1]) + [unresolved]
+    results.append(('game length', chi_square_gof(observed, length)[2]))
+
+    shares = [reference['end_mechanisms'][name] for name in END_MECHANISMS] + [0.0]
+    results.append(('end mechanisms', chi_square_gof(_end_counts(sample, stop), shares)[2]))
+
+    first_end = _histogram(sample['first_end'], MAX_TURNS + 1)
+    observed = list(first_end[1:stop + 1]) + [first_end[0] + first_end[stop + 1:].sum()]  # Turn 0 marks "never"
+    expected = list(reference['first_end'][1:stop + 1]) + [reference['first_end_never'] + unresolved]
+    results.append(('first End turn (or never)', chi_square_gof(observed, expected)[2]))
+
+    resolved = sample['turns'][sample['turns'] <= stop]
+    sd = float(np.std(resolved, ddof=1))
+    z = (float(np.mean(resolved)) - reference['mean_turns'] / (1 - unresolved)) / (sd / math.sqrt(len(resolved)))
+    results.append(('mean turns', 2 * normal_sf(abs(z))))
+
+    for turn in [turn for turn in OCCUPANCY_TURNS if turn <= stop]:
+        expected = reference['occupancy'][turn]
+        if sample['occupancy'][turn].sum() and expected.sum() > 0:
+            results.append((f"dice occupancy turn {turn}", chi_square_gof(sample['occupancy'][turn], expected)[2]))
+    return results
+
+def tests_against_sample(sample, reference):
+    """ [(name, p-value)] for one engine's sample against another engine's sample. """
+    results = [('game length', chi_square_two_sample(_histogram(sample['turns'], MAX_TURNS + 1),
+                                                     _histogram(reference['turns'], MAX_TURNS + 1))[2]),
+               ('end mechanisms', chi_square_two_sample(_end_counts(sample), _end_counts(reference))[2]),
+               ('first End turn', chi_square_two_sample(_histogram(sample['first_end'], MAX_TURNS + 1),
+                                                        _histogram(reference['first_end'], MAX_TURNS + 1))[2])]
+    for turn in OCCUPANCY_TURNS:
+        if sample['occupancy'][turn].sum() and reference['occupancy'][turn].sum():
+            results.append((f"dice occupancy turn {turn}",
+                            chi_square_two_sample(sample['occupancy'][turn], reference['occupancy'][turn])[2]))
+    return results
+
+def check_engines(variant='FiveESimulations', ruleset='DemonDiceTable4', engines=tuple(ENGINES), reference='exact',
+                  num_games=20000, seed=0, alpha=0.001, cache=None):
+    """
+    Run every engine and test it against the reference ('exact' or an engine name).
+    Returns (passed, rows) where rows are (engine, test, p-value, passed); each test is held
+    to alpha / number of tests, so the whole check has a false-alarm rate of at most alpha.
+    """
+    if reference == 'exact':
+        reference_data = exact_reference(variant, ruleset, cache)
+        test = tests_against_exact
+    else:
+        reference_data = ENGINES[reference](variant, ruleset, num_games, seed + 1)
+        test = tests_against_sample
+        engines = [name for name in engines if name != reference]
+
+    raw = []
+    for name in engines:
+        sample = ENGINES[name](variant, ruleset, num_games, seed)
+        raw += [(name, test_name, p) for test_name, p in test(sample, reference_data)]
+
+    threshold = alpha / max(1, len(raw))
+    rows = [(name, test_name, p, p >= threshold) for name, test_name, p in raw]
+    return all(row[3] for row in rows), rows
+
+def print_check(passed, rows, alpha):
+    print(f"{'Engine':<12} {'Test':<26} {'p-value':>10}")
+    for name, test_name, p, ok in rows:
+        print(f"{name:<12} {test_name:<26} {p:>10.4g}  {'ok' if ok else 'FAIL'}")
+    print(f"\n{'PASSED' if passed else 'FAILED'} (family-wise false-alarm rate {alpha}, {len(rows)} tests)")
+
+# Main execution block
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test engines against exact or reference distributions")
+    parser.add_argument('--variant', default='FiveESimulations', choices=['simulations', 'FiveESimulations'])
+    parser.add_argument('--ruleset', default='DemonDiceTable4')
+    parser.add_argument('--engines', nargs='+', default=list(ENGINES), choices=list(ENGINES))
+    parser.add_argument('--reference', default='exact', choices=['exact'] + list(ENGINES))
+    parser.add_argument('--games', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--alpha', type=float, default=0.001)
+    parser.add_argument('--cache', default=None, help="Pickle file to keep the exact reference in between runs")
+    args = parser.parse_args()
+
+    passed, rows = check_engines(args.variant, args.ruleset, args.engines, args.reference, args.games, args.seed,
+                                 args.alpha, args.cache)
+    print_check(passed, rows, args.alpha)
+    sys.exit(0 if passed else 1)
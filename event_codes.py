@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Integer codes for game-log events. batch_runner's 'event_columns' output turns each
+game's entry['events'] strings into small int columns as the game finishes, so a
+batch can be classified without keeping its logs or matching strings like
+'Repeat End 3' again afterwards:
+
+    columns = run_chunk('FiveESimulations', 'DemonDiceTable4', 7, 0, 100000, ['event_columns'])['event_columns']
+    classified = classify_games(columns)
+"""
+from array import array
+
+NONE = 0  # "No event": also the end code of a game whose last turn logged nothing ('fault')
+FIGHT = 1
+ACCELERATE = 2  # 'Accelerate mode on'
+END = 3
+REPEAT_END = 4  # 'Repeat End N'
+END_FLAGS = 5
+TPK = 6
+TURN_LIMIT = 7  # '200 turns'
+
+EVENT_NAMES = ('fault', 'Fight', 'Accelerate mode on', 'End', 'Repeat End', 'End Flags', 'TPK', '200 turns')
+_CODES = {name: code for code, name in enumerate(EVENT_NAMES)}
+
+def event_code(name):
+    """ Code for an event string as the engines log it. """
+    code = _CODES.get(name)
+    if code is None:
+        if not name.startswith('Repeat End'):
+            raise ValueError(f"Unknown event {name!r}")
+        code = REPEAT_END  # 'Repeat End N' for every N
+    return code
+
+def entry_codes(entry):
+    """ A log entry's events as codes. """
+    return [event_code(name) for name in entry['events']]
+
+def new_columns():
+    """
+    Columnar event store for a batch: one row per logged event (game, turn, code),
+    in game order, plus each game's final turn.
+    """
+    return {'game': array('I'), 'turn': array('H'), 'code': array('B'), 'final_turn': array('H')}
+
+def add_game(columns, simulation_log):
+    game = len(columns['final_turn'])
+    for entry in simulation_log:
+        for name in entry['events']:  # Most turns log nothing
+            columns['game'].append(game)
+            columns['turn'].append(entry['turn'])
+            columns['code'].append(event_code(name))
+    columns['final_turn'].append(simulation_log[-1]['turn'])
+
+def merge_columns(columns, other):
+    """ Append other's games after columns' games, renumbering them. """
+    offset = len(columns['final_turn'])
+    columns['game'].extend(game + offset for game in other['game'])
+    for name in ('turn', 'code', 'final_turn'):
+        columns[name].extend(other[name])
+    return columns
+
+def columns_from_logs(sim_logs):
+    """ Columns for logs that were kept anyway; batch_runner's 'event_columns' output avoids keeping them. """
+    columns = new_columns()
+    for simulation_log in sim_logs:
+        add_game(columns, simulation_log)
+    return columns
+
+def first_turns(game, turn, code, wanted, num_games):
+    """ Turn of each game's first event with code `wanted` (0 if it never happened). """
+    import numpy as np
+
+    mask = code == wanted
+    games, first = np.unique(game[mask], return_index=True)  # Rows are in game/turn order
+    result = np.zeros(num_games, dtype=np.int64)
+    result[games] = turn[mask][first]
+    return result
+
+def classify_games(columns):
+    """
+    End mechanism code and first End / Fight / Accelerate turns for every game at once.
+    Returns numpy arrays indexed by game; turn arrays use 0 for "never".
+    """
+    import numpy as np  # Only classification needs NumPy
+
+    game = np.asarray(columns['game'], dtype=np.int64)
+    turn = np.asarray(columns['turn'], dtype=np.int64)
+    code = np.asarray(columns['code'], dtype=np.uint8)
+    final_turn = np.asarray(columns['final_turn'], dtype=np.int64)
+    num_games = len(final_turn)
+
+    # End mechanism: the first event logged on each game's final turn
+    on_last_turn = turn == final_turn[game]
+    games, first = np.unique(game[on_last_turn], return_index=True)
+    end_code = np.zeros(num_games, dtype=np.uint8)  # NONE -> 'fault'
+    end_code[games] = code[on_last_turn][first]
+
+    return {
+        'turns': final_turn,
+        'end_code': end_code,
+        'first_end_turn': first_turns(game, turn, code, END, num_games),
+        'first_fight_turn': first_turns(game, turn, code, FIGHT, num_games),
+        'first_accelerate_turn': first_turns(game, turn, code, ACCELERATE, num_games)
+    }
+
+def end_mechanism_names(end_code):
+    """ End codes as the strings run_multiple_simulations reports. """
+    return [EVENT_NAMES[code] for code in end_code]
+
+# Main execution block
+if __name__ == "__main__":
+    from collections import Counter
+    from batch_runner import run_chunk
+
+    columns = run_chunk('FiveESimulations', 'DemonDiceTable4', 2024, 0, 5000, ['event_columns'])['event_columns']
+    classified = classify_games(columns)
+    print(Counter(end_mechanism_names(classified['end_code'])))
+    for name in ('first_end_turn', 'first_fight_turn', 'first_accelerate_turn'):
+        turns = classified[name][classified[name] > 0]
+        print(f"{name}: {len(turns)} games, mean turn {turns.mean():.2f}")
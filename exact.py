@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exact game distributions by dynamic programming. Instead of sampling games, the
+probability of every reachable game state is pushed forward one turn at a time,
+following sim() rule for rule (36+ clamp, skipped invalid totals, repeated flags
+falling back to rule 5, repeated End flags, Accelerate mode, FiveE roll gating).
+
+The state probabilities live in one array indexed by
+    [dice pair, End count, Accelerate mode, one axis per tracked flagged row, damage level]
+Only flagged rows whose first and repeated effects differ get an axis. Damage is
+split into the first-roll damage of those rows (known from which axes are set) and
+the rest, counted in steps of the gcd of the repeatable damages. Any state at 100+
+damage is a TPK on the next turn, so it is taken out of the array right away.
+"""
+import math
+import numpy as np
+import simulations
+import FiveESimulations
+from outcome_matrix import outcome_matrix, is_gated
+
+MAX_TURNS = 200  # sim() stops every game on turn 200
+TPK_DAMAGE = 100
+END_FLAGS_NEEDED = 4
+
+def dice_changer(engine):
+    """ (change(dice, step, gate) -> new dice tuple, gated) for either engine's change_dice_size. """
+    gated = is_gated(engine)
+    cache = {}
+
+    def change(dice, step, gate):
+        if step == 0:
+            return dice
+        key = (dice, step, gate)
+        if key not in cache:
+            if gated:
+                rolls = [1, 1] if gate else [2, 1]  # Any rolls with the same rolls[1] >= rolls[0] outcome
+                cache[key] = tuple(engine.change_dice_size(list(dice), step, rolls))
+            else:
+                cache[key] = tuple(engine.change_dice_size(list(dice), step))
+        return cache[key]
+
+    return change, gated
+
+def classify_rows(rules):
+    """
+    Sort rows by how sim() treats them on a repeat roll:
+        'plain'  same effect every time (no flag, or a flag whose first effect equals rule 5's)
+        'end'    End flag, counts towards the four End flags every time
+        'accel'  the table's only Accelerate row; its seen state is the Accelerate mode itself
+        'bit'    first roll and repeats differ, so it gets its own seen axis
+    """
+    fallback = rules[3]
+    accelerate_rows = [i for i, rule in enumerate(rules) if rule['event_flag'] == 'Accelerate']
+    kinds = []
+    for i, rule in enumerate(rules):
+        flag = rule['event_flag']
+        if not flag:
+            kinds.append('plain')
+        elif flag == 'End':
+            kinds.append('end')
+        elif flag == 'Accelerate':
+            kinds.append('accel' if len(accelerate_rows) == 1 else 'bit')
+        elif flag != 'Fight' and rule['die_size_change'] == fallback['die_size_change'] \
+                and rule['damage'] == fallback['damage']:
+            kinds.append('plain')
+        else:
+            kinds.append('bit')
+    return kinds
+
+def exact_distributions(engine=simulations, filename="DemonDiceTable4", rules=None, max_turns=MAX_TURNS,
+                        tolerance=0.0, max_cells=60_000_000, occupancy=False, damage_bands=None):
+    """
+    Exact per-turn distributions of a game under engine's rules.
+
+    Returns a dict with (lists indexed by turn, index 0 unused):
+        'length'          P(game ends on turn t)
+        'survival'        P(game still running after turn t)
+        'first_end'       P(first 'End' event on turn t); 'first_end_never' is the rest
+        'accelerate'      P(Accelerate mode switches on in turn t); 'accelerate_never' is the rest
+        'end_mechanisms'  {'TPK': p, 'End Flags': p, '200 turns': p}
+        'fight_count'     {fights: p}
+        'truncation'      mass stopped by the turn cap ('200 turns')
+        'mean_turns'      expected game length
+        'unresolved'      mass still running when the solve stopped early (0.0 unless tolerance > 0)
+        'occupancy'       only with occupancy=True: per turn, P(game plays turn t on each dice pair),
+                          an array over outcome_matrix pairs (games that end on turn t included)
+        'occupancy_accelerate'  the same, counting only games already in Accelerate mode
+        'occupancy_damage'      only with damage_bands (ascending lower edges): per turn,
+                                P(game plays turn t with its damage so far in each band)
+
+    tolerance > 0 stops as soon as fewer than that fraction of games are still running,
+    which skips the long thin tail of turns; the leftover is reported, not redistributed.
+    """
+    if rules is None:
+        rules = engine.read_rules_from_csv(f"{filename}.csv", verbose=False)
+    if len(rules) < 4:
+        raise ValueError("Rule table needs at least 4 rows (rule 5 is the repeat fallback)")
+
+    change, gated = dice_changer(engine)
+    fallback = rules[3]
+    kinds = classify_rows(rules)
+
+    matrix = outcome_matrix(engine, rules=rules)
+    pairs = matrix['pairs']
+    pair_index = matrix['pair_index']
+    num_pairs = len(pairs)
+
+    bit_rows = [i for i, kind in enumerate(kinds) if kind == 'bit']
+    bit_axis = {row: 3 + n for n, row in enumerate(bit_rows)}  # Axes: pair, End count, mode, bits..., damage
+    num_bits = len(bit_rows)
+    accel_row = kinds.index('accel') if 'accel' in kinds else None
+    has_accelerate = accel_row is not None or any(rules[i]['event_flag'] == 'Accelerate' for i in bit_rows)
+    modes = (0, 1) if has_accelerate else (0,)
+
+    # Damage outside the first rolls of tracked rows moves in steps of the gcd
+    repeat_damages = [rules[i]['damage'] for i, kind in enumerate(kinds) if kind in ('plain', 'end')]
+    if bit_rows or accel_row is not None:
+        repeat_damages.append(fallback['damage'])
+    step = math.gcd(*[abs(d) for d in repeat_damages if d]) if any(repeat_damages) else 1
+    lowest = min([0] + repeat_damages)
+    base_min = max_turns * lowest  # Lowest damage the repeatable rows could ever reach
+    first_damages = [rules[i]['damage'] for i in bit_rows] + ([rules[accel_row]['damage']] if accel_row is not None else [])
+    first_min = sum(d for d in first_damages if d < 0)
+    live_levels = max(1, math.ceil((TPK_DAMAGE - first_min - base_min) / step))  # Above this every state is a TPK
+    num_levels = live_levels + max(0, max([0] + repeat_damages)) // step
+
+    shape = (num_pairs, END_FLAGS_NEEDED, 2, *([2] * num_bits), num_levels)
+    if math.prod(shape) > max_cells:
+        raise ValueError(f"State array {shape} is too large for an exact solve; use a simulation batch instead")
+
+    # Per-(mode, bits, level) damage, TPK region and per-bits fight count
+    grids = np.indices((2, *([2] * num_bits), num_levels), sparse=True)
+    damage = base_min + grids[-1] * step
+    if accel_row is not None:
+        damage = damage + rules[accel_row]['damage'] * grids[0]
+    for n, row in enumerate(bit_rows):
+        damage = damage + rules[row]['damage'] * grids[1 + n]
+    survives = np.broadcast_to(damage < TPK_DAMAGE, (2, *([2] * num_bits), num_levels))
+
+    fights = np.zeros([2] * num_bits, dtype=np.int64)
+    bit_grids = np.indices([2] * num_bits) if num_bits else []
+    for n, row in enumerate(bit_rows):
+        if rules[row]['event_flag'] == 'Fight':
+            fights = fights + bit_grids[n]
+    fights = fights.ravel()
+
+    def index(pair, end_count=slice(None), mode=slice(None), bits=None, levels=slice(None)):
+        key = [pair, end_count, mode] + [slice(None)] * num_bits + [levels]
+        for row, value in (bits or {}).items():
+            key[bit_axis[row]] = value
+        return tuple(key)
+
+    def shifted(shift):
+        """ (source levels, destination levels) for moving damage up by shift steps. """
+        start = max(0, -shift)
+        return slice(start, live_levels), slice(start + shift, live_levels + shift)
+
+    # Precompute the turn's transitions from each dice pair as (source view, destination view, probability)
+    ops = []
+    end_prob = matrix['flag_prob']['End']
+    accelerate_prob = matrix['flag_prob']['Accelerate']
+    row_gate_prob = matrix['row_gate_prob']
+    for i, dice in enumerate(pairs):
+        merged = {}
+
+        def add(key, p):
+            merged[key] = merged.get(key, 0.0) + p
+
+        if matrix['invalid_prob'][i] > 0:
+            add(('skip',), float(matrix['invalid_prob'][i]))
+        for rule_index, gate in zip(*np.nonzero(row_gate_prob[i])):
+            p = float(row_gate_prob[i, rule_index, gate])
+            rule_index, gate = int(rule_index), bool(gate)
+            rule = rules[rule_index]
+            kind = kinds[rule_index]
+
+            for mode in modes:
+                accelerated = change(dice, 1, gate) if mode else dice
+                if kind == 'plain':
+                    j = pair_index[change(accelerated, rule['die_size_change'], gate)]
+                    add(('plain', mode, j, rule['damage'] // step), p)
+                elif kind == 'end':
+                    j = pair_index[change(accelerated, rule['die_size_change'], gate)]
+                    add(('end', mode, j, rule['damage'] // step), p)
+                elif kind == 'accel':
+                    if mode == 0:
+                        j = pair_index[change(dice, rule['die_size_change'], gate)]
+                        add(('accel_first', j), p)
+                    else:
+                        j = pair_index[change(accelerated, fallback['die_size_change'], gate)]
+                        add(('plain', 1, j, fallback['damage'] // step), p)
+                else:
+                    j = pair_index[change(accelerated, rule['die_size_change'], gate)]
+                    new_mode = 1 if rule['event_flag'] == 'Accelerate' else mode
+                    add(('bit_first', mode, rule_index, j, new_mode), p)
+                    j = pair_index[change(accelerated, fallback['die_size_change'], gate)]
+                    add(('bit_repeat', mode, rule_index, j, fallback['damage'] // step), p)
+
+        for key, p in merged.items():
+            kind = key[0]
+            if kind == 'skip':
+                ops.append((i, index(i), index(i), p))
+            elif kind == 'plain':
+                _, mode, j, shift = key
+                src, dst = shifted(shift)
+                ops.append((i, index(i, mode=mode, levels=src), index(j, mode=mode, levels=dst), p))
+            elif kind == 'end':
+                _, mode, j, shift = key
+                src, dst = shifted(shift)
+                ops.append((i, index(i, slice(0, END_FLAGS_NEEDED - 1), mode, levels=src),
+                            index(j, slice(1, END_FLAGS_NEEDED), mode, levels=dst), p))
+            elif kind == 'accel_first':
+                _, j = key
+                ops.append((i, index(i, mode=0), index(j, mode=1), p))
+            elif kind == 'bit_first':
+                _, mode, row, j, new_mode = key
+                ops.append((i, index(i, mode=mode, bits={row: 0}), index(j, mode=new_mode, bits={row: 1}), p))
+            else:
+                _, mode, row, j, shift = key
+                src, dst = shifted(shift)
+                ops.append((i, index(i, mode=mode, bits={row: 1}, levels=src),
+                            index(j, mode=mode, bits={row: 1}, levels=dst), p))
+
+    length = [0.0] * (max_turns + 1)
+    survival = [0.0] * (max_turns + 1)
+    first_end = [0.0] * (max_turns + 1)
+    accelerate = [0.0] * (max_turns + 1)
+    end_mechanisms = {'TPK': 0.0, 'End Flags': 0.0, '200 turns': 0.0}
+    fight_count = np.zeros(num_bits + 1)
+
+    def fights_of(mass):
+        """ Histogram of fight counts for mass over (mode, bits..., levels). """
+        by_bits = mass.sum(axis=(0, mass.ndim - 1)).ravel()
+        return np.bincount(fights, weights=by_bits, minlength=num_bits + 1)
+
+    state = np.zeros(shape)
+    state[index(pair_index[tuple(sorted(engine.start_dice))], 0, 0, {row: 0 for row in bit_rows}, -base_min // step)] = 1.0
+    pending_tpk = np.zeros(num_bits + 1)  # Reached 100 damage last turn, by fight count
+    if damage_bands:
+        bands = np.searchsorted(damage_bands, np.broadcast_to(damage, survives.shape), side='right') - 1
+        bands = np.maximum(bands, 0).ravel()  # Healing below the first edge stays in the first band
+
+    def occupied(mass):
+        """ (by pair, by pair in Accelerate mode, by damage band) for mass over the state axes. """
+        by_pair = mass.reshape(num_pairs, -1).sum(axis=1)
+        by_accelerate = mass[:, :, 1].reshape(num_pairs, -1).sum(axis=1)
+        by_band = np.bincount(bands, weights=mass.reshape(num_pairs * END_FLAGS_NEEDED, -1).sum(axis=0),
+                              minlength=len(damage_bands)) if damage_bands else None
+        return by_pair, by_accelerate, by_band
+
+    pending_occupied = None  # occupied() of the pending TPK mass, kept only for occupancy
+    occupancy_by_turn = {}
+    if occupancy:
+        occupancy_by_turn['occupancy'] = [np.zeros(num_pairs) for _ in range(max_turns + 1)]
+        occupancy_by_turn['occupancy_accelerate'] = [np.zeros(num_pairs) for _ in range(max_turns + 1)]
+        if damage_bands:
+            occupancy_by_turn['occupancy_damage'] = [np.zeros(len(damage_bands)) for _ in range(max_turns + 1)]
+
+    def record_occupancy(turn):
+        for name, now, pending in zip(occupancy_by_turn, occupied(state), pending_occupied or (0.0, 0.0, 0.0)):
+            occupancy_by_turn[name][turn] = now + pending
+    buffers = {}  # Scratch arrays by shape, reused every turn
+    unresolved = 0.0
+
+    for turn in range(1, max_turns + 1):
+        if turn >= max_turns:
+            if occupancy:
+                record_occupancy(turn)
+            ending = fights_of(state.sum(axis=(0, 1))) + pending_tpk
+            end_mechanisms['200 turns'] += float(ending.sum())
+            length[turn] += float(ending.sum())
+            fight_count += ending
+            break
+
+        if pending_tpk.any():
+            end_mechanisms['TPK'] += float(pending_tpk.sum())
+            length[turn] += float(pending_tpk.sum())
+            fight_count += pending_tpk
+
+        pair_mass = state.reshape(num_pairs, -1).sum(axis=1)
+        if occupancy:
+            record_occupancy(turn)
+        first_end[turn] = float(end_prob @ state[:, 0].reshape(num_pairs, -1).sum(axis=1))
+        accelerate[turn] = float(accelerate_prob @ state[:, :, 0].reshape(num_pairs, -1).sum(axis=1)) if has_accelerate else 0.0
+        ending = fights_of(np.tensordot(end_prob, state[:, END_FLAGS_NEEDED - 1], axes=(0, 0)))
+        end_mechanisms['End Flags'] += float(ending.sum())
+        length[turn] += float(ending.sum())
+        fight_count += ending
+
+        next_state = np.zeros(shape)
+        for i, src, dst, p in ops:
+            if pair_mass[i] > 0:
+                source = state[src]
+                buffer = buffers.get(source.shape)
+                if buffer is None:
+                    buffer = buffers[source.shape] = np.empty(source.shape)
+                np.multiply(source, p, out=buffer)
+                next_state[dst] += buffer
+
+        ended = next_state.sum(axis=(0, 1))
+        ended[survives] = 0.0
+        pending_tpk = fights_of(ended)
+        if occupancy:
+            pending_occupied = occupied(np.where(survives, 0.0, next_state))
+        next_state *= survives
+
+        state = next_state
+        survival[turn] = float(state.sum() + pending_tpk.sum())
+        if survival[turn] <= tolerance:
+            unresolved = survival[turn]
+            break
+
+    result = {
+        'length': length,
+        'survival': survival,
+        'first_end': first_end,
+        'first_end_never': 1.0 - sum(first_end) - unresolved,
+        'accelerate': accelerate,
+        'accelerate_never': 1.0 - sum(accelerate) - unresolved,
+        'end_mechanisms': end_mechanisms,
+        'fight_count': {k: float(p) for k, p in enumerate(fight_count) if p > 0},
+        'truncation': end_mechanisms['200 turns'],
+        'mean_turns': sum(t * p for t, p in enumerate(length)),
+        'unresolved': unresolved
+    }
+    result.update(occupancy_by_turn)
+    return result
+
+# Main execution block
+if __name__ == "__main__":
+    for engine in (simulations, FiveESimulations):
+        result = exact_distributions(engine)
+        print(f"\n{engine.__name__}: mean turns {result['mean_turns']:.3f}, truncated at cap {result['truncation']:.3e}")
+        print("End mechanisms:", {k: round(v, 5) for k, v in result['end_mechanisms'].items()})
+        print("Fights:", {k: round(v, 5) for k, v in result['fight_count'].items()})
+        print(f"P(no End) {result['first_end_never']:.5f}, P(no Accelerate) {result['accelerate_never']:.5f}")
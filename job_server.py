@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local simulation job service. Analysts share one warm worker pool over localhost
+TCP or a Unix socket instead of each notebook paying startup and CSV parse costs.
+
+Protocol: one JSON object per line.
+    -> {"op": "submit", "job": {"variant": "FiveESimulations", "ruleset": "DemonDiceTable4",
+                                "num_simulations": 5000, "seed": 1, "outputs": [...], "chunk_size": 250}}
+    <- {"type": "accepted", "job_id": ...}
+    <- {"type": "progress", "job_id": ..., "done": ..., "total": ..., "partial": {...}}   (repeated)
+    <- {"type": "result", "job_id": ..., "outputs": [...], "result": [[...], ...]}
+    -> {"op": "cancel", "job_id": ...}    <- {"type": "cancelled", "job_id": ...}
+    -> {"op": "status"}                   <- {"type": "status", "jobs": {...}}
+"""
+import json
+import socket
+import asyncio
+import argparse
+import itertools
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from batch_runner import VARIANTS, OUTPUTS, load_rules, run_chunk, new_aggregates, merge_aggregates
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+_job_ids = itertools.count(1)
+
+def _warm_worker(preload):
+    """ Pool initializer: parse the commonly used rulesets once per worker process. """
+    for variant, ruleset in preload:
+        load_rules(variant, ruleset)
+
+def new_partial():
+    return {'games': 0, 'turns_total': 0, 'fights_total': 0, 'end_mechanisms': Counter(), 'first_end_games': 0}
+
+def update_partial(partial, chunk):
+    partial['games'] += len(chunk['turns_list'])
+    partial['turns_total'] += sum(chunk['turns_list'])
+    partial['fights_total'] += sum(chunk['fight_count'])
+    partial['end_mechanisms'].update(chunk['end_mechanisms'])
+    partial['first_end_games'] += len(chunk['first_end_turns'])
+
+def partial_report(partial):
+    games = partial['games']
+    return {
+        'games': games,
+        'mean_turns': partial['turns_total'] / games if games else None,
+        'mean_fights': partial['fights_total'] / games if games else None,
+        'end_mechanisms': dict(partial['end_mechanisms']),
+        'first_end_games': partial['first_end_games']
+    }
+
+def parse_job(job):
+    if not isinstance(job, dict):
+        raise ValueError(f"Expected a job object, got {type(job).__name__}")
+    variant = job.get('variant', 'FiveESimulations')
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown variant {variant!r}")
+    outputs = list(job.get('outputs') or VARIANTS[variant][1])
+    unknown = [name for name in outputs if name not in OUTPUTS]
+    if unknown:
+        raise ValueError(f"Unknown outputs {unknown}")
+    # The running summary always needs these, whatever else was asked for
+    worker_outputs = sorted(set(outputs) | {'turns_list', 'fight_count', 'end_mechanisms', 'first_end_turns'}, key=OUTPUTS.index)
+    return {
+        'variant': variant,
+        'ruleset': job.get('ruleset', 'DemonDiceTable4'),
+        'num_simulations': int(job.get('num_simulations', 1000)),
+        'seed': job.get('seed', 0),
+        'outputs': outputs,
+        'worker_outputs': worker_outputs,
+        'chunk_size': max(1, int(job.get('chunk_size', 250)))
+    }
+
+def _release_job(job):
+    """ Done callback: the job table outlives its jobs, so keep only the small status fields. """
+    job.pop('task', None)
+    if job['state'] == 'running':  # Cancelled before it ever started
+        job['state'] = 'cancelled'
+
+async def run_job(job_id, spec, pool, jobs, send):
+    loop = asyncio.get_running_loop()
+    total = spec['num_simulations']
+
+    futures = {}
+    for start in range(0, total, spec['chunk_size']):
+        count = min(spec['chunk_size'], total - start)
+        future = loop.run_in_executor(pool, run_chunk, spec['variant'], spec['ruleset'], spec['seed'],
+                                      start, count, spec['worker_outputs'])
+        futures[future] = start
+
+    chunks = {}
+    partial = new_partial()
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                chunk = future.result()
+                chunks[futures[future]] = chunk
+                update_partial(partial, chunk)
+            jobs[job_id]['done'] = partial['games']
+            send({'type': 'progress', 'job_id': job_id, 'done': partial['games'], 'total': total,
+                  'partial': partial_report(partial)})
+    except asyncio.CancelledError:
+        for future in pending:
+            future.cancel()
+        jobs[job_id]['state'] = 'cancelled'
+        send({'type': 'cancelled', 'job_id': job_id, 'done': partial['games'], 'partial': partial_report(partial)})
+        return
+    except Exception as e:
+        for future in pending:
+            future.cancel()
+        jobs[job_id]['state'] = 'failed'
+        send({'type': 'error', 'job_id': job_id, 'error': str(e)})
+        return
+
+    # Stitch chunks back together in game order so results match a serial run
+    aggregates = new_aggregates()
+    for start in sorted(chunks):
+        merge_aggregates(aggregates, chunks[start])
+    jobs[job_id]['state'] = 'finished'
+    send({'type': 'result', 'job_id': job_id, 'variant': spec['variant'], 'outputs': spec['outputs'],
+          'result': [aggregates[name] for name in spec['outputs']]})
+
+async def handle_client(reader, writer, pool, jobs):
+    def send(message):
+        if not writer.is_closing():
+            writer.write((json.dumps(message) + "\n").encode())
+
+    tasks = []
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                message = json.loads(line)
+                if not isinstance(message, dict):
+                    raise ValueError(f"Expected a JSON object, got {type(message).__name__}")
+                op = message.get('op')
+                if op == 'submit':
+                    spec = parse_job(message.get('job', {}))
+                    job_id = next(_job_ids)
+                    jobs[job_id] = {'state': 'running', 'done': 0, 'total': spec['num_simulations'],
+                                    'variant': spec['variant'], 'ruleset': spec['ruleset']}
+                    send({'type': 'accepted', 'job_id': job_id})
+                    task = asyncio.create_task(run_job(job_id, spec, pool, jobs, send))
+                    jobs[job_id]['task'] = task
+                    task.add_done_callback(lambda task, job_id=job_id: _release_job(jobs[job_id]))
+                    tasks.append(task)
+                elif op == 'cancel':
+                    job = jobs.get(message.get('job_id'))
+                    if job is None or job['state'] != 'running':
+                        send({'type': 'error', 'error': f"No running job {message.get('job_id')}"})
+                    else:
+                        job['task'].cancel()
+                elif op == 'status':
+                    send({'type': 'status', 'jobs': {job_id: {k: v for k, v in job.items() if k != 'task'}
+                                                     for job_id, job in jobs.items()}})
+                else:
+                    send({'type': 'error', 'error': f"Unknown op {op!r}"})
+            except (ValueError, TypeError) as e:
+                send({'type': 'error', 'error': str(e)})
+            await writer.drain()
+
+        # Client hung up after submitting; let its jobs finish so the results are not half-written
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        writer.close()
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None, workers=None, preload=()):
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker, initargs=(tuple(preload),))
+    jobs = {}
+
+    async def client_connected(reader, writer):
+        await handle_client(reader, writer, pool, jobs)
+
+    if unix_socket:
+        server = await asyncio.start_unix_server(client_connected, path=unix_socket)
+        print(f"Job server listening on {unix_socket}")
+    else:
+        server = await asyncio.start_server(client_connected, host, port)
+        print(f"Job server listening on {host}:{port}")
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+def _connect(host, port, unix_socket):
+    if unix_socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(unix_socket)
+        return sock
+    return socket.create_connection((host, port))
+
+def submit_job(job, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None, on_message=None):
+    """
+    Blocking client: submit a job and wait for it. on_message(msg) sees every
+    accepted/progress message (accepted carries the job_id needed to cancel).
+    Returns the result tuple in the variant's run_multiple_simulations shape.
+    """
+    with _connect(host, port, unix_socket) as sock:
+        sock.sendall((json.dumps({'op': 'submit', 'job': job}) + "\n").encode())
+        for line in sock.makefile('r'):
+            message = json.loads(line)
+            if message['type'] == 'result':
+                return tuple(message['result'])
+            if message['type'] == 'error':
+                raise RuntimeError(message['error'])
+            if message['type'] == 'cancelled':
+                raise RuntimeError(f"Job {message['job_id']} was cancelled after {message['done']} games")
+            if on_message is not None:
+                on_message(message)
+    raise RuntimeError("Job server closed the connection before returning a result")
+
+def cancel_job(job_id, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None):
+    with _connect(host, port, unix_socket) as sock:
+        sock.sendall((json.dumps({'op': 'cancel', 'job_id': job_id}) + "\n").encode())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Demon Dice simulation job server")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix', dest='unix_socket', help="Listen on a Unix socket path instead of TCP")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--preload', nargs='*', default=['DemonDiceTable4'], help="Rulesets to parse in every worker at startup")
+    args = parser.parse_args()
+
+    preload = [(variant, ruleset) for ruleset in args.preload for variant in VARIANTS]
+    asyncio.run(serve(args.host, args.port, args.unix_socket, args.workers, preload))
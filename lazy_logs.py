@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Seed-only batch runs. Every game of a seeded run plays on its own dice stream
+game_rng(seed, i), so a batch only keeps a few bytes of summary per game and any
+full per-turn log can be played again exactly when someone asks for it.
+"""
+import sys
+from array import array
+from collections.abc import Sequence
+from batch_stats import game_rng, summarize_game
+from batch_runner import load_engine, load_rules
+
+END_MECHANISMS = ('TPK', 'End Flags', '200 turns', 'fault')  # Stored as an index into this tuple
+HIGH_ROLL = 25  # Lucky.plot_luck_heatmap ranks games by the first total at or above this
+
+def run_seeded_batch(variant='FiveESimulations', ruleset='DemonDiceTable4', num_simulations=1000, seed=0):
+    """
+    Play a seeded run, keeping only per-game summaries in compact columns.
+    Turn columns use 0 for "never happened".
+    """
+    engine = load_engine(variant)
+    rules = load_rules(variant, ruleset)
+
+    batch = {
+        'variant': variant,
+        'ruleset': ruleset,
+        'seed': seed,
+        'turns': array('H'),
+        'end_mechanism': array('B'),
+        'fight_count': array('B'),
+        'first_end_turn': array('H'),
+        'first_high_turn': array('H')
+    }
+
+    for i in range(num_simulations):
+        simulation_log, f_count = engine.sim(rng=game_rng(seed, i), rules=rules, verbose=False)
+        summary = summarize_game(simulation_log, f_count)
+        batch['turns'].append(summary['turns'])
+        batch['end_mechanism'].append(END_MECHANISMS.index(summary['end_mechanism']))
+        batch['fight_count'].append(f_count)
+        batch['first_end_turn'].append(summary['first_end_turn'] or 0)
+        batch['first_high_turn'].append(next((entry['turn'] for entry in simulation_log
+                                              if entry['total_roll'] >= HIGH_ROLL), 0))
+    return batch
+
+def batch_size(batch):
+    """ Number of games in a batch. """
+    return len(batch['turns'])
+
+def batch_bytes(batch):
+    """ Approximate memory held by the summary columns. """
+    return sum(sys.getsizeof(column) for column in batch.values() if isinstance(column, array))
+
+def replay_game(batch, index):
+    """ Play game `index` of a batch again, returning (simulation_log, fight_count) exactly as sim() did. """
+    if not 0 <= index < batch_size(batch):
+        raise IndexError(f"Game {index} is not in this batch of {batch_size(batch)}")
+    engine = load_engine(batch['variant'])
+    rules = load_rules(batch['variant'], batch['ruleset'])
+    return engine.sim(rng=game_rng(batch['seed'], index), rules=rules, verbose=False)
+
+def game_summary(batch, index):
+    return {
+        'game': index,
+        'turns': batch['turns'][index],
+        'end_mechanism': END_MECHANISMS[batch['end_mechanism'][index]],
+        'fight_count': batch['fight_count'][index],
+        'first_end_turn': batch['first_end_turn'][index] or None,
+        'first_high_turn': batch['first_high_turn'][index] or None
+    }
+
+def summary_lists(batch):
+    """ turns_list, end_mechanisms, fight_count, first_end_turns as run_multiple_simulations returns them. """
+    return (
+        list(batch['turns']),
+        [END_MECHANISMS[code] for code in batch['end_mechanism']],
+        list(batch['fight_count']),
+        [turn for turn in batch['first_end_turn'] if turn]
+    )
+
+def select_games(batch, column, count=3, largest=False):
+    """
+    Indices of the `count` games with the smallest (or largest) value in a summary column.
+    "Never" (0) sorts after every real turn, as Lucky treats a game that never rolls high.
+    """
+    values = batch[column]
+    never = float('inf') if not largest else float('-inf')
+    order = sorted(range(batch_size(batch)), key=lambda i: values[i] or never, reverse=largest)
+    return order[:count]
+
+class LazyLogs(Sequence):
+    """
+    Stand-in for the sim_logs list: each log is replayed when it is indexed, so
+    plotting code can walk a million games without holding them all in memory.
+    """
+    def __init__(self, batch, indices=None):
+        self.batch = batch
+        self.indices = range(batch_size(batch)) if indices is None else list(indices)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return LazyLogs(self.batch, self.indices[item])
+        return replay_game(self.batch, self.indices[item])[0]
+
+# Main execution block
+if __name__ == "__main__":
+    from FiveESimulations import plog
+
+    batch = run_seeded_batch(num_simulations=5000, seed=2024)
+    print(f"{batch_size(batch)} games summarised in {batch_bytes(batch)} bytes")
+
+    longest = select_games(batch, 'turns', count=1, largest=True)[0]
+    print("Longest game:", game_summary(batch, longest))
+    plog(replay_game(batch, longest)[0])
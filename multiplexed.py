@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batched engine for comparing many rule tables in one run. Games for every table
+are played together, one NumPy step per turn: each game carries a ruleset index,
+the K tables are stacked into one (K, rows, 3) array and every turn gathers each
+game's row from it. It follows sim() rule for rule (36+ clamp, skipped totals past
+the table, first-roll flags, repeats falling back to rule 5, End counting,
+Accelerate mode, FiveE roll gating) but draws its dice from NumPy, so individual
+games do not replay game_rng streams; the distributions are the same.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from batch_runner import load_engine, load_rule_rows, new_aggregates, merge_aggregates
+from outcome_matrix import chain_pairs
+from exact import dice_changer, MAX_TURNS, TPK_DAMAGE, END_FLAGS_NEEDED
+from rule_compiler import FLAGS, rule_rows
+
+FIGHT, ACCELERATE, END = (FLAGS.index(flag) for flag in ('Fight', 'Accelerate', 'End'))
+OUTPUTS = ('turns_list', 'end_mechanisms', 'fight_count', 'first_end_turns')  # What the batched engine keeps
+END_NAMES = ('200 turns', 'TPK', 'End Flags')
+
+def stack_rules(rule_tables):
+    """
+    (K, rows, 3) int array of [die_size_change, damage, flag code] plus each table's row count.
+    Each table is a list of rule dicts or an array of rows from load_rule_rows.
+    """
+    tables = [rule_rows(rules) if isinstance(rules, list) else rules for rules in rule_tables]
+    stacked = np.zeros((len(tables), max(len(table) for table in tables), 3), dtype=np.int64)
+    for k, table in enumerate(tables):
+        for column, field in enumerate(('die_size_change', 'damage', 'flag')):
+            stacked[k, :len(table), column] = table[field]
+    return stacked, np.array([len(table) for table in tables])
+
+def transition_table(engine, steps):
+    """ next_pair[step index, pair, gate] for every die change in steps, via the engine's own change_dice_size. """
+    change, _ = dice_changer(engine)
+    pairs = chain_pairs(engine)
+    pair_index = {pair: i for i, pair in enumerate(pairs)}
+    table = np.zeros((len(steps), len(pairs), 2), dtype=np.int64)
+    for s, step in enumerate(steps):
+        for i, dice in enumerate(pairs):
+            for gate in (0, 1):
+                table[s, i, gate] = pair_index[change(dice, step, bool(gate))]
+    return table
+
+def play_multiplexed(variant, rule_tables, ruleset_of_game, rng, occupancy=False):
+    """
+    Play one game per entry of ruleset_of_game (indices into rule_tables, as for stack_rules) in lockstep.
+    Returns per-game arrays: turns, end (index into END_NAMES), fights, first_end (0 = never).
+    occupancy=True adds 'occupancy', counts [ruleset, turn, pair] of games playing each
+    turn on each chain_pairs pair (games that end on that turn included).
+    """
+    engine = load_engine(variant)
+    _, gated = dice_changer(engine)
+    stacked, num_rows = stack_rules(rule_tables)
+    if (num_rows < 4).any():
+        raise ValueError("Every rule table needs at least 4 rows (rule 5 is the repeat fallback)")
+    steps = np.arange(min(0, stacked[:, :, 0].min()), max(1, stacked[:, :, 0].max()) + 1)
+    next_pair = transition_table(engine, steps)
+    pairs = np.array(chain_pairs(engine))
+    start = chain_pairs(engine).index(tuple(sorted(engine.start_dice)))
+
+    n = len(ruleset_of_game)
+    k = np.asarray(ruleset_of_game)
+    pair = np.full(n, start)
+    damage = np.zeros(n, dtype=np.int64)
+    end_count = np.zeros(n, dtype=np.int64)
+    accelerate = np.zeros(n, dtype=bool)
+    seen = np.zeros(n, dtype=np.uint64)  # Bit i set once row i's flag has been used
+    turns = np.zeros(n, dtype=np.int64)
+    fights = np.zeros(n, dtype=np.int64)
+    first_end = np.zeros(n, dtype=np.int64)
+    end = np.full(n, -1)
+    active = np.arange(n)
+    num_tables, num_pairs = len(rule_tables), len(pairs)
+    counts = np.zeros((num_tables, MAX_TURNS + 1, num_pairs), dtype=np.int64) if occupancy else None
+
+    for turn in range(1, MAX_TURNS + 1):
+        if not len(active):
+            break
+        turns[active] = turn  # A skipped turn logs nothing, but games only ever end on a logged turn
+        if occupancy:
+            counts[:, turn] = np.bincount(k[active] * num_pairs + pair[active],
+                                          minlength=num_tables * num_pairs).reshape(num_tables, num_pairs)
+
+        # Turn cap first, then TPK from last turn's damage, exactly in sim()'s order
+        if turn >= MAX_TURNS:
+            end[active] = 0
+            break
+        tpk = damage[active] >= TPK_DAMAGE
+        end[active[tpk]] = 1
+        active = active[~tpk]
+
+        dice = pairs[pair[active]]
+        r0 = (rng.random(len(active)) * dice[:, 0]).astype(np.int64) + 1
+        r1 = (rng.random(len(active)) * dice[:, 1]).astype(np.int64) + 1
+        row = np.minimum(r0 + r1, 35) - 2
+        valid = row < num_rows[k[active]]  # Totals past the table skip the rest of the turn
+        skipped = active[~valid]
+        games, row, r0, r1 = active[valid], row[valid], r0[valid], r1[valid]
+        gate = (r1 >= r0).astype(np.int64) if gated else np.ones(len(games), dtype=np.int64)
+
+        # Accelerate mode moves the dice up before the row takes effect
+        on = accelerate[games]
+        pair[games[on]] = next_pair[1 - steps[0], pair[games[on]], gate[on]]
+
+        die_change, row_damage, flag = stacked[k[games], row].T
+        bit = np.left_shift(np.uint64(1), row.astype(np.uint64))
+        repeat = (seen[games] & bit) != 0
+        flagged = flag != 0
+        first = flagged & ~repeat
+        seen[games[first]] |= bit[first]
+        fights[games[first & (flag == FIGHT)]] += 1
+        accelerate[games[first & (flag == ACCELERATE)]] = True
+
+        is_end = flagged & (flag == END)
+        end_count[games[is_end]] += 1
+        finished = is_end & (end_count[games] >= END_FLAGS_NEEDED)
+        new_first_end = first & is_end & ~finished & (first_end[games] == 0)
+        first_end[games[new_first_end]] = turn
+        end[games[finished]] = 2
+
+        # Other repeated flags play rule 5 instead
+        fallback = flagged & repeat & ~is_end
+        fallback_rows = stacked[k[games[fallback]], 3]
+        die_change[fallback] = fallback_rows[:, 0]
+        row_damage[fallback] = fallback_rows[:, 1]
+
+        playing = ~finished
+        moved = playing & (die_change != 0)
+        pair[games[moved]] = next_pair[die_change[moved] - steps[0], pair[games[moved]], gate[moved]]
+        damage[games[playing]] += row_damage[playing]
+
+        active = np.sort(np.concatenate([skipped, games[playing]]))
+
+    played = {'turns': turns, 'end': end, 'fights': fights, 'first_end': first_end}
+    if occupancy:
+        played['occupancy'] = counts
+    return played
+
+def _chunk(args):
+    variant, rulesets, games_per_ruleset, seed, chunk = args
+    rule_tables = [load_rule_rows(variant, ruleset) for ruleset in rulesets]
+    ruleset_of_game = np.repeat(np.arange(len(rulesets)), games_per_ruleset)
+    played = play_multiplexed(variant, rule_tables, ruleset_of_game, np.random.default_rng([seed, chunk]))
+
+    per_ruleset = {}
+    for index, ruleset in enumerate(rulesets):
+        mine = ruleset_of_game == index
+        aggregates = new_aggregates()
+        aggregates['turns_list'] = played['turns'][mine].tolist()
+        aggregates['end_mechanisms'] = [END_NAMES[e] for e in played['end'][mine]]  # Final turns log one event
+        aggregates['fight_count'] = played['fights'][mine].tolist()
+        first_end = played['first_end'][mine]
+        aggregates['first_end_turns'] = first_end[first_end > 0].tolist()
+        per_ruleset[ruleset] = aggregates
+    return per_ruleset
+
+def run_multiplexed(variant='FiveESimulations', rulesets=('DemonDiceTable4',), games_per_ruleset=10000, seed=0,
+                    workers=1, chunk_games=2000):
+    """
+    games_per_ruleset games for every ruleset (names as for load_rules, so compiled .ddr
+    tables load instantly) in one batched run. Chunks of chunk_games games per ruleset
+    are spread over `workers` processes. Returns {ruleset: aggregates} with OUTPUTS filled.
+    """
+    jobs = [(variant, list(rulesets), min(chunk_games, games_per_ruleset - start), seed, c)
+            for c, start in enumerate(range(0, games_per_ruleset, chunk_games))]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = list(pool.map(_chunk, jobs))
+    else:
+        chunks = [_chunk(job) for job in jobs]
+
+    results = {ruleset: new_aggregates() for ruleset in rulesets}
+    for chunk in chunks:
+        for ruleset in rulesets:
+            merge_aggregates(results[ruleset], chunk[ruleset])
+    return results
+
+# Main execution block
+if __name__ == "__main__":
+    from collections import Counter
+    from statistics import mean
+
+    results = run_multiplexed(rulesets=['DemonDiceTable4'], games_per_ruleset=20000, seed=2024, workers=4)
+    for ruleset, aggregates in results.items():
+        print(ruleset, f"mean turns {mean(aggregates['turns_list']):.2f}", Counter(aggregates['end_mechanisms']))
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-turn dice-state occupancy as a batch aggregate. For every turn it counts the
+games playing that turn on each dice pair, split by Accelerate mode, and optionally
+by bands of damage taken so far. TwoDTwenty.py answers one of these questions with
+a pass over every retained log; here batch_runner folds each game in as it is
+played and the counts merge across workers by addition:
+
+    aggregates = run_chunk('FiveESimulations', 'DemonDiceTable4', 7, 0, 10000, ['occupancy'])
+    plot_pairs(aggregates['occupancy'], 'dice_occupancy.png')
+
+exact_occupancy builds the same structure from the exact solver (probabilities
+instead of counts).
+"""
+from bisect import bisect_right
+import numpy as np
+from outcome_matrix import chain_pairs
+
+MAX_TURNS = 200
+DAMAGE_BANDS = (0, 25, 50, 75, 100)  # Lower edges; 100+ is the turn a TPK is logged
+FLUSH_AT = 1_000_000  # Pending turn codes kept before they are counted
+
+def new_occupancy(engine, damage_bands=None, max_turns=MAX_TURNS):
+    """
+    Empty occupancy for an engine's dice chain:
+        'counts'  [turn, pair, mode] games playing turn t on pair (rows of 'pairs'), mode 1 = Accelerate
+        'damage'  [turn, band] games playing turn t with damage so far in each band (None without bands)
+    """
+    pairs = chain_pairs(engine)
+    return {
+        'pairs': pairs,
+        'pair_index': {pair: i for i, pair in enumerate(pairs)},
+        'damage_bands': tuple(damage_bands) if damage_bands else None,
+        'counts': np.zeros((max_turns + 1, len(pairs), 2), dtype=np.int64),
+        'damage': np.zeros((max_turns + 1, len(damage_bands)), dtype=np.int64) if damage_bands else None,
+        'games': 0,
+        'pending': ([], [])  # Flat codes into counts and damage, counted in bulk by flush()
+    }
+
+def add_game(occupancy, simulation_log):
+    """ Queue one game's turns. A skipped turn logs nothing but keeps its dice, so it takes the next entry's. """
+    pair_index = occupancy['pair_index']
+    bands = occupancy['damage_bands']
+    pending_counts, pending_damage = occupancy['pending']
+    num_bands = len(bands) if bands else 0
+    row = 2 * len(pair_index)
+
+    turn = 1
+    mode = 0
+    damage = 0  # Damage so far; an entry's cumulative_damage already includes its own turn
+    for entry in simulation_log:
+        code = pair_index[tuple(entry['demon_dice'])] * 2 + mode
+        band = max(0, bisect_right(bands, damage) - 1) if bands else 0
+        while turn <= entry['turn']:
+            pending_counts.append(turn * row + code)
+            if bands:
+                pending_damage.append(turn * num_bands + band)
+            turn += 1
+        if 'Accelerate mode on' in entry['events']:
+            mode = 1
+        damage = entry['cumulative_damage']
+    occupancy['games'] += 1
+    if len(pending_counts) >= FLUSH_AT:
+        flush(occupancy)
+
+def flush(occupancy):
+    """ Count every queued turn with one bincount per tensor. """
+    pending_counts, pending_damage = occupancy['pending']
+    if pending_counts:
+        counts = occupancy['counts']
+        counts += np.bincount(pending_counts, minlength=counts.size).reshape(counts.shape)
+        pending_counts.clear()
+    if pending_damage:
+        damage = occupancy['damage']
+        damage += np.bincount(pending_damage, minlength=damage.size).reshape(damage.shape)
+        pending_damage.clear()
+    return occupancy
+
+def merge_occupancy(occupancy, other):
+    """ Add other's counts into occupancy (workers' chunks merge in any order). """
+    flush(occupancy)
+    flush(other)
+    if occupancy['pairs'] != other['pairs'] or occupancy['damage_bands'] != other['damage_bands']:
+        raise ValueError("Cannot merge occupancy counted over different dice pairs or damage bands")
+    occupancy['counts'] += other['counts']
+    if occupancy['damage'] is not None:
+        occupancy['damage'] += other['damage']
+    occupancy['games'] += other['games']
+    return occupancy
+
+def exact_occupancy(engine, rules, damage_bands=None, tolerance=1e-9):
+    """ The same structure from exact_distributions, holding P(playing turn t in each state). """
+    from exact import exact_distributions
+    result = exact_distributions(engine, rules=rules, tolerance=tolerance, occupancy=True, damage_bands=damage_bands)
+    occupancy = new_occupancy(engine, damage_bands)
+    occupancy['counts'] = np.zeros(occupancy['counts'].shape)
+    occupancy['counts'][:, :, 1] = result['occupancy_accelerate']
+    occupancy['counts'][:, :, 0] = np.array(result['occupancy']) - occupancy['counts'][:, :, 1]
+    if damage_bands:
+        occupancy['damage'] = np.array(result['occupancy_damage'])
+    occupancy['games'] = 1.0
+    return occupancy
+
+def running(occupancy):
+    """ Games (or probability) still playing on each turn. """
+    return flush(occupancy)['counts'].sum(axis=(1, 2))
+
+def shares(occupancy, by='pair'):
+    """
+    [turn, column] share of still-running games, 0 once none are left. by is 'pair'
+    (columns = pairs), 'accelerate' (off, on) or 'damage' (columns = damage bands).
+    """
+    flush(occupancy)
+    if by == 'pair':
+        table = occupancy['counts'].sum(axis=2)
+    elif by == 'accelerate':
+        table = occupancy['counts'].sum(axis=1)
+    elif by == 'damage':
+        if occupancy['damage'] is None:
+            raise ValueError("Occupancy was counted without damage bands")
+        table = occupancy['damage']
+    else:
+        raise ValueError(f"Unknown grouping {by!r}, expected 'pair', 'accelerate' or 'damage'")
+    total = table.sum(axis=1, keepdims=True)
+    return np.divide(table, total, out=np.zeros(table.shape), where=total > 0)
+
+def fraction_at(occupancy, pair):
+    """ Per-turn share of running games on one pair (TwoDTwenty's question for pair=(20, 20)). """
+    return shares(occupancy)[:, occupancy['pair_index'][tuple(sorted(pair))]]
+
+def last_turn(occupancy):
+    played = np.nonzero(running(occupancy))[0]
+    return int(played[-1]) if len(played) else 0
+
+def _labels(occupancy, by):
+    if by == 'pair':
+        return [f"d{a}/d{b}" for a, b in occupancy['pairs']]
+    if by == 'accelerate':
+        return ['Normal', 'Accelerate mode']
+    bands = occupancy['damage_bands']
+    return [f"{low}-{high - 1}" for low, high in zip(bands, bands[1:])] + [f"{bands[-1]}+"]
+
+def plot_occupancy(occupancy, by='pair', filename=None, max_turn=None, top=10, show_survival=True):
+    """
+    Stacked area chart of shares(occupancy, by) per turn. For pairs only the `top`
+    busiest are drawn on their own and the rest are stacked as 'other'. Saves to
+    filename if given; returns the figure.
+    """
+    from matplotlib.figure import Figure
+
+    table = shares(occupancy, by)
+    labels = _labels(occupancy, by)
+    max_turn = max_turn or last_turn(occupancy)
+    turns = np.arange(1, max_turn + 1)
+    table = table[1:max_turn + 1]
+    if by == 'pair' and len(labels) > top:
+        busiest = np.sort(np.argsort(occupancy['counts'].sum(axis=(0, 2)))[-top:])
+        rest = np.setdiff1d(np.arange(len(labels)), busiest)
+        table = np.column_stack([table[:, busiest], table[:, rest].sum(axis=1)])
+        labels = [labels[i] for i in busiest] + ['other']
+
+    colors = [f"C{i % 10}" for i in range(len(labels))]
+    if labels[-1] == 'other':
+        colors[-1] = 'lightgrey'
+
+    figure = Figure(figsize=(11, 5.5))
+    ax = figure.add_subplot()
+    ax.stackplot(turns, table.T, labels=labels, colors=colors, alpha=0.85)
+    if show_survival:
+        alive = running(occupancy)[1:max_turn + 1]
+        ax.plot(turns, alive / alive[0], color='black', linestyle='--', linewidth=1.5, label='Games remaining')
+    ax.set_xlim(1, max_turn)
+    ax.set_ylim(0, 1)
+    ax.set_xlabel('Turn Number')
+    ax.set_ylabel('Share of Running Games')
+    ax.set_title({'pair': 'Demon Dice per Turn', 'accelerate': 'Accelerate Mode per Turn',
+                  'damage': 'Damage Taken per Turn'}[by])
+    ax.legend(loc='center left', bbox_to_anchor=(1.01, 0.5), fontsize='small')
+    figure.tight_layout()
+    if filename:
+        figure.savefig(filename)
+    return figure
+
+def plot_pairs(occupancy, filename=None, **options):
+    return plot_occupancy(occupancy, 'pair', filename, **options)
+
+def plot_accelerate(occupancy, filename=None, **options):
+    return plot_occupancy(occupancy, 'accelerate', filename, **options)
+
+def plot_damage(occupancy, filename=None, **options):
+    return plot_occupancy(occupancy, 'damage', filename, **options)
+
+# Main execution block
+if __name__ == "__main__":
+    from batch_runner import run_threaded
+
+    aggregates = run_threaded('FiveESimulations', 'DemonDiceTable4', 20000, seed=2024, outputs=['occupancy'],
+                              damage_bands=DAMAGE_BANDS)
+    occupancy = aggregates['occupancy']
+    plot_pairs(occupancy, 'dice_occupancy.png')
+    plot_accelerate(occupancy, 'accelerate_occupancy.png')
+    plot_damage(occupancy, 'damage_occupancy.png')
+    print(f"{occupancy['games']} games; share at (20, 20) on turn 40: {fraction_at(occupancy, (20, 20))[40]:.3f}")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+What one turn looks like from each dice pair. For every pair on the engine's
+dice_chain the chance of landing on each CSV row is fixed by the table alone
+(36+ totals clamp to 35, totals past the table are the "Invalid rule index.
+Skipping..." mass), so it is worked out once per ruleset and shared by the exact
+solver, analysis code and anything else that needs per-pair turn odds.
+
+Expected damage and die change are for a row's normal effect; a repeated flagged
+row falls back to rule 5 in sim(), which depends on the game so far, not the pair.
+"""
+import inspect
+import numpy as np
+import simulations
+import FiveESimulations
+from rule_compiler import FLAGS as FLAG_CODES, rule_rows
+
+FLAGS = ('Fight', 'Accelerate', 'End', 'Once')
+
+_matrix_cache = {}  # (engine name, row bytes) -> matrix
+
+def chain_pairs(engine):
+    """ Every dice pair on the engine's chain, smaller die first, in the exact solver's order. """
+    chain = engine.dice_chain
+    return [(a, b) for n, a in enumerate(chain) for b in chain[n:]]
+
+def is_gated(engine):
+    """ FiveESimulations only changes dice when rolls[1] >= rolls[0]; its change_dice_size takes the rolls. """
+    return len(inspect.signature(engine.change_dice_size).parameters) == 3
+
+def outcome_matrix(engine=FiveESimulations, filename="DemonDiceTable4", rules=None):
+    """
+    Per-pair turn odds for a rule table, as numpy arrays indexed by pair (rows of 'pairs'):
+        'row_gate_prob'        [pair, row, gate] P(landing on row with rolls[1] >= rolls[0] == gate);
+                               ungated engines put everything under gate True
+        'row_prob'             [pair, row] P(landing on row)
+        'invalid_prob'         [pair] P(total past the table, turn skipped)
+        'clamp_prob'           [pair] P(total of 36+, played as 35)
+        'expected_damage'      [pair] expected damage of the row landed on
+        'expected_die_change'  [pair] expected die_size_change of the row landed on
+        'flag_prob'            {flag: [pair]} P(landing on a row with that event flag)
+
+    rules is a list of rule dicts or an array of rows (batch_runner.load_rule_rows); by
+    default filename's numeric rows are read, straight from its .ddr when that is up to date.
+    """
+    if rules is None:
+        from batch_runner import load_rule_rows
+        rows = load_rule_rows(engine.__name__, filename)
+    else:
+        rows = rule_rows(rules) if isinstance(rules, list) else rules
+    key = (engine.__name__, np.asarray(rows).tobytes())
+    if key in _matrix_cache:
+        return _matrix_cache[key]
+
+    pairs = chain_pairs(engine)
+    gated = is_gated(engine)
+    num_rules = len(rows)
+    row_gate_prob = np.zeros((len(pairs), num_rules, 2))
+    invalid_prob = np.zeros(len(pairs))
+    clamp_prob = np.zeros(len(pairs))
+
+    for i, (d0, d1) in enumerate(pairs):
+        p = 1.0 / (d0 * d1)
+        for r0 in range(1, d0 + 1):
+            for r1 in range(1, d1 + 1):
+                if r0 + r1 >= 36:
+                    clamp_prob[i] += p
+                rule_index = min(r0 + r1, 35) - 2  # sim() clamps 36+ to 35
+                if rule_index < 0 or rule_index >= num_rules:
+                    invalid_prob[i] += p
+                else:
+                    row_gate_prob[i, rule_index, int(r1 >= r0 if gated else True)] += p
+
+    row_prob = row_gate_prob.sum(axis=2)
+    damage = rows['damage'].astype(float)
+    die_change = rows['die_size_change'].astype(float)
+    matrix = {
+        'engine': engine.__name__,
+        'pairs': pairs,
+        'pair_index': {pair: i for i, pair in enumerate(pairs)},
+        'gated': gated,
+        'rules': rules if isinstance(rules, list) else None,  # Only rule dicts carry flavor text
+        'row_gate_prob': row_gate_prob,
+        'row_prob': row_prob,
+        'invalid_prob': invalid_prob,
+        'clamp_prob': clamp_prob,
+        'expected_damage': row_prob @ damage,
+        'expected_die_change': row_prob @ die_change,
+        'flag_prob': {flag: row_prob[:, rows['flag'] == FLAG_CODES.index(flag)].sum(axis=1) for flag in FLAGS}
+    }
+    _matrix_cache[key] = matrix
+    return matrix
+
+def pair_summary(matrix, dice):
+    """ One pair's turn odds as plain numbers, e.g. pair_summary(m, (12, 20)). """
+    i = matrix['pair_index'][tuple(sorted(dice))]
+    return {
+        'dice': matrix['pairs'][i],
+        'rows': {row: float(p) for row, p in enumerate(matrix['row_prob'][i]) if p > 0},
+        'invalid': float(matrix['invalid_prob'][i]),
+        'clamped': float(matrix['clamp_prob'][i]),
+        'expected_damage': float(matrix['expected_damage'][i]),
+        'expected_die_change': float(matrix['expected_die_change'][i]),
+        'flags': {flag: float(p[i]) for flag, p in matrix['flag_prob'].items()}
+    }
+
+def print_pair_summary(matrix, dice):
+    summary = pair_summary(matrix, dice)
+    d0, d1 = summary['dice']
+    print(f"\nd{d0}/d{d1} turn ({matrix['engine']})")
+    print(f"Expected damage {summary['expected_damage']:.3f}, expected die change {summary['expected_die_change']:+.3f}")
+    print(f"Skipped (past the table) {summary['invalid']:.4f}, clamped 36+ {summary['clamped']:.4f}")
+    print("Flags:", {flag: round(p, 4) for flag, p in summary['flags'].items() if p > 0})
+    for row, p in summary['rows'].items():
+        label = matrix['rules'][row]['flavor_text'][:48] if matrix['rules'] else f"total {row + 2}"  # Flavor text starts with the total
+        print(f"  {label:<48} {p:.4f}")
+
+# Main execution block
+if __name__ == "__main__":
+    for engine, dice in ((FiveESimulations, (12, 20)), (simulations, (6, 6))):
+        rules = engine.read_rules_from_csv("DemonDiceTable4.csv", verbose=False)  # Rule dicts, for the flavor text
+        print_pair_summary(outcome_matrix(engine, rules=rules), dice)
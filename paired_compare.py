@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Paired comparison of two rule tables on common random numbers.
+"""
+import math
+from statistics import variance
+import simulations
+import FiveESimulations
+from batch_stats import game_rng, summarize_game, mean_ci, Z_95
+
+def run_paired_simulations(sim_a=simulations.sim, sim_b=FiveESimulations.sim, num_simulations=1000, seed=0):
+    """
+    Run both variants on the same per-game dice streams (common random numbers).
+    sim_a / sim_b are any sim() callables accepting rng= and verbose=, e.g.
+    functools.partial(simulations.sim, "DemonDiceTable5") to compare two tables.
+
+    Returns two lists of per-game summaries, paired by index.
+    """
+    games_a = []
+    games_b = []
+
+    for i in range(num_simulations):
+        log_a, f_count_a = sim_a(rng=game_rng(seed, i), verbose=False)
+        log_b, f_count_b = sim_b(rng=game_rng(seed, i), verbose=False)
+        games_a.append(summarize_game(log_a, f_count_a))
+        games_b.append(summarize_game(log_b, f_count_b))
+
+    return games_a, games_b
+
+def paired_difference(values_a, values_b, z=Z_95):
+    """
+    Mean of the per-game differences (b - a) with its confidence interval.
+    'independent_se' is what two unpaired batches of the same size would give;
+    'variance_ratio' is roughly how many times more games that would need.
+    """
+    diffs = [b - a for a, b in zip(values_a, values_b)]
+    result = mean_ci(diffs, z)
+
+    n = len(diffs)
+    if n > 1:
+        independent_se = math.sqrt((variance(values_a) + variance(values_b)) / n)
+    else:
+        independent_se = 0.0
+    result['independent_se'] = independent_se
+    result['variance_ratio'] = (independent_se / result['se']) ** 2 if result['se'] > 0 else float('inf')
+    return result
+
+def compare_summaries(games_a, games_b, z=Z_95):
+    """ Paired differences for mean turns, fight count and each end mechanism's share. """
+    report = {
+        'turns': paired_difference([g['turns'] for g in games_a], [g['turns'] for g in games_b], z),
+        'fight_count': paired_difference([g['fight_count'] for g in games_a], [g['fight_count'] for g in games_b], z),
+        'end_mechanisms': {}
+    }
+
+    mechanisms = sorted({g['end_mechanism'] for g in games_a} | {g['end_mechanism'] for g in games_b})
+    for mechanism in mechanisms:
+        share_a = [1 if g['end_mechanism'] == mechanism else 0 for g in games_a]
+        share_b = [1 if g['end_mechanism'] == mechanism else 0 for g in games_b]
+        report['end_mechanisms'][mechanism] = paired_difference(share_a, share_b, z)
+
+    return report
+
+def print_comparison(report):
+    def line(label, r):
+        print(f"{label:<22} diff {r['mean']:+.4f}  95% CI [{r['low']:+.4f}, {r['high']:+.4f}]  "
+              f"se {r['se']:.4f} (unpaired {r['independent_se']:.4f}, x{r['variance_ratio']:.1f} fewer games)")
+
+    line('Turns', report['turns'])
+    line('Fights', report['fight_count'])
+    for mechanism, r in report['end_mechanisms'].items():
+        line(f"Share '{mechanism}'", r)
+
+# Main execution block
+if __name__ == "__main__":
+    games_a, games_b = run_paired_simulations(num_simulations=2000, seed=2024)
+    print("FiveESimulations.sim minus simulations.sim (paired by dice stream):")
+    print_comparison(compare_summaries(games_a, games_b))
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk validation and compilation of rule tables. read_rules_from_csv skips short
+rows and prints its way past bad cells, so a broken table only shows up as odd
+results after a long batch. This checks every CSV in a directory in parallel and
+fails fast, then writes each good table as a compiled .ddr file that
+batch_runner.load_rules memory-maps instead of parsing the CSV again. Array code
+(batch_runner.load_rule_rows) maps the numeric row block directly, with no rule dicts:
+
+    python rule_compiler.py tables/            (compile every tables/*.csv next to it)
+    python rule_compiler.py tables/ --check    (validate only, and hash-check existing .ddr files)
+
+Loading trusts a .ddr while its CSV keeps the mtime and size it was compiled from;
+the stored sha256 is only compared on request (verify_hash=True, or --check), since
+hashing the CSV costs more than parsing it.
+
+.ddr layout (little-endian): header '<8sIIqq32s' (magic, rows, text bytes, source
+mtime_ns, source size, source sha256), then per row '<hhB' (die_size_change,
+damage, flag code), then rows + 1 uint32 text offsets, then the UTF-8 flavor text.
+"""
+import os
+import csv
+import sys
+import mmap
+import glob
+import struct
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import simulations
+import FiveESimulations
+
+FLAGS = ('', 'Fight', 'Accelerate', 'End', 'Once')  # Stored as an index into this tuple
+CHAINS = {engine.__name__: engine.dice_chain for engine in (simulations, FiveESimulations)}
+MAGIC = b'DDRULES1'
+HEADER = struct.Struct('<8sIIqq32s')
+ROW = struct.Struct('<hhB')
+ROW_FIELDS = [('die_size_change', '<i2'), ('damage', '<i2'), ('flag', 'u1')]  # NumPy dtype of one ROW
+COMPILED_EXTENSION = '.ddr'
+
+def reachable_rows(chain):
+    """ Rows a game can land on: totals 2 .. min(2 * largest die, 35) (sim() clamps 36+ to 35). """
+    return min(2 * max(chain), 35) - 1
+
+def validate_table(path, chains=CHAINS):
+    """
+    Strictly parse one CSV. Returns (rules, errors, warnings); rules matches what
+    read_rules_from_csv returns for a table without errors.
+    """
+    rules, errors, warnings = [], [], []
+    try:
+        with open(path, mode='r') as file:  # Same open() as read_rules_from_csv, so flavor text matches
+            rows = list(csv.reader(file))
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        return [], [f"cannot read: {e}"], []
+
+    for line, row in enumerate(rows, start=1):
+        if not row:
+            warnings.append(f"line {line}: blank row is skipped")
+            continue
+        if len(row) < 4:
+            # sim() would skip it, shifting every later row onto the wrong total
+            errors.append(f"line {line}: {len(row)} columns, need 4 (flavor text, die size change, damage, flag)")
+            continue
+        try:
+            die_size_change = int(row[1]) if row[1] else 0
+            damage = int(row[2]) if row[2] else 0
+        except ValueError:
+            errors.append(f"line {line}: die size change {row[1]!r} and damage {row[2]!r} must be whole numbers")
+            continue
+        if not -32768 <= die_size_change <= 32767 or not -32768 <= damage <= 32767:
+            errors.append(f"line {line}: value out of range")
+            continue
+        if row[3] not in FLAGS:
+            errors.append(f"line {line}: unknown event flag {row[3]!r}, expected one of {FLAGS[1:]} or blank")
+            continue
+        rules.append({'flavor_text': row[0], 'die_size_change': die_size_change, 'damage': damage, 'event_flag': row[3]})
+
+    if len(rules) < 4:
+        errors.append(f"{len(rules)} rows; rule 5 (row 4) is the repeat fallback, so at least 4 are needed")
+    for name, chain in chains.items():
+        needed = reachable_rows(chain)
+        if len(rules) < needed:
+            errors.append(f"{len(rules)} rows but {name} can roll totals up to {needed + 1}; "
+                          f"totals {len(rules) + 2}..{needed + 1} would be skipped")
+        elif len(rules) > needed:
+            warnings.append(f"rows past total {needed + 1} can never be rolled in {name}")
+    return rules, errors, warnings
+
+def compiled_path(csv_path):
+    return os.path.splitext(csv_path)[0] + COMPILED_EXTENSION
+
+def file_digest(path):
+    """ sha256 of a file's bytes, e.g. to tell two copies of a rule table apart. """
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).digest()
+
+def rule_rows(rules):
+    """ Rules as a NumPy array of .ddr rows (ROW_FIELDS; 'flag' is an index into FLAGS). """
+    import numpy as np
+    return np.array([(rule['die_size_change'], rule['damage'], FLAGS.index(rule['event_flag'])) for rule in rules],
+                    dtype=ROW_FIELDS)
+
+def write_compiled(rules, csv_path, out_path=None):
+    """ Write rules as a .ddr file stamped with the source CSV's mtime, size and hash. """
+    out_path = out_path or compiled_path(csv_path)
+    stat = os.stat(csv_path)
+    digest = file_digest(csv_path)
+
+    texts = [rule['flavor_text'].encode('utf-8') for rule in rules]
+    offsets = [0]
+    for text in texts:
+        offsets.append(offsets[-1] + len(text))
+    parts = [HEADER.pack(MAGIC, len(rules), offsets[-1], stat.st_mtime_ns, stat.st_size, digest)]
+    parts += [ROW.pack(rule['die_size_change'], rule['damage'], FLAGS.index(rule['event_flag'])) for rule in rules]
+    parts.append(struct.pack(f'<{len(offsets)}I', *offsets))
+    parts += texts
+
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(b''.join(parts))
+    os.replace(tmp_path, out_path)
+    return out_path
+
+def _read_header(data, path):
+    """ (rows, (source mtime_ns, size, sha256)) from the start of a .ddr file. """
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is not a compiled rule table")
+    magic, num_rows, _, mtime_ns, size, digest = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a compiled rule table")
+    return num_rows, (mtime_ns, size, digest)
+
+def is_current(stamp, source, verify_hash=False):
+    """
+    Whether the CSV `source` is unchanged since it was compiled into a .ddr with this
+    stamp: same mtime and size, and with verify_hash also the same sha256 (copies made
+    with cp -p or rsync -a keep the mtime, so only the hash catches an edit between them).
+    """
+    stat = os.stat(source)
+    if (stat.st_mtime_ns, stat.st_size) != stamp[:2]:
+        return False
+    return not verify_hash or file_digest(source) == stamp[2]
+
+def load_compiled(path, source=None, verify_hash=False):
+    """
+    Rules from a .ddr file via mmap, in read_rules_from_csv's format. With `source`
+    (the CSV), returns None if the CSV has changed since it was compiled (see is_current).
+    """
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        num_rows, stamp = _read_header(data, path)
+        if source is not None and not is_current(stamp, source, verify_hash):
+            return None
+        rows_at = HEADER.size
+        offsets_at = rows_at + num_rows * ROW.size
+        text_at = offsets_at + 4 * (num_rows + 1)
+        offsets = struct.unpack_from(f'<{num_rows + 1}I', data, offsets_at)
+        rules = []
+        for i, (die_size_change, damage, flag) in enumerate(ROW.iter_unpack(data[rows_at:offsets_at])):
+            rules.append({
+                'flavor_text': data[text_at + offsets[i]:text_at + offsets[i + 1]].decode('utf-8'),
+                'die_size_change': die_size_change,
+                'damage': damage,
+                'event_flag': FLAGS[flag]
+            })
+    return rules
+
+def load_compiled_rows(path, source=None, verify_hash=False):
+    """
+    The numeric row block of a .ddr file as a read-only NumPy array over the mmap (ROW_FIELDS), for
+    array code that has no use for rule dicts or flavor text. None if stale, as for load_compiled.
+    """
+    import numpy as np
+    with open(path, 'rb') as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)  # Stays mapped while the array is alive
+    num_rows, stamp = _read_header(data, path)
+    if source is not None and not is_current(stamp, source, verify_hash):
+        return None
+    return np.frombuffer(data, dtype=ROW_FIELDS, count=num_rows, offset=HEADER.size)
+
+def compile_table(csv_path, check_only=False):
+    """
+    Validate one table and, if it has no errors, compile it. Returns a report dict.
+    check_only writes nothing, and warns if an existing .ddr no longer matches the CSV's sha256.
+    """
+    rules, errors, warnings = validate_table(csv_path)
+    report = {'path': csv_path, 'rows': len(rules), 'errors': errors, 'warnings': warnings, 'compiled': None}
+    if check_only:
+        out_path = compiled_path(csv_path)
+        try:
+            if os.path.exists(out_path) and load_compiled(out_path, csv_path, verify_hash=True) is None:
+                warnings.append(f"{out_path} is out of date; compile again")
+        except (ValueError, struct.error) as e:
+            warnings.append(f"{out_path} cannot be read ({e}); compile again")
+    elif not errors:
+        report['compiled'] = write_compiled(rules, csv_path)
+    return report
+
+def compile_directory(directory, check_only=False, workers=None):
+    """ compile_table for every *.csv in directory, in parallel. Reports in file name order. """
+    paths = sorted(glob.glob(os.path.join(directory, '*.csv')))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(compile_table, paths, [check_only] * len(paths)))
+
+# Main execution block
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate and compile Demon Dice rule tables")
+    parser.add_argument('directory', nargs='?', default='.')
+    parser.add_argument('--check', action='store_true', help="Validate only, write nothing; hash-check existing .ddr files")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    reports = compile_directory(args.directory, args.check, args.workers)
+    for report in reports:
+        status = 'FAIL' if report['errors'] else 'ok'
+        print(f"{status:4} {report['path']} ({report['rows']} rows){' -> ' + report['compiled'] if report['compiled'] else ''}")
+        for message in report['errors']:
+            print(f"     error: {message}")
+        for message in report['warnings']:
+            print(f"     warning: {message}")
+    sys.exit(1 if any(report['errors'] for report in reports) else 0)
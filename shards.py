@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sharded batch runs across several hosts with nothing but a shared filesystem.
+Each host is told (seed, shard index, shard count), plays its own block of game
+streams and writes a self-describing shard file; merging any complete set of
+shard files gives exactly what one run of all the games would have returned.
+
+    python shards.py run --seed 7 --games 1000000 --shard 3 --of 16 --out shards/
+    python shards.py merge shards/*.shard --out study.pkl
+"""
+import os
+import pickle
+import argparse
+from batch_runner import VARIANTS, run_chunk, new_aggregates, merge_aggregates, as_results, save_checkpoint
+from rule_compiler import file_digest
+from sketches import new_sketches, merge_sketches, sketch_quantiles
+
+SHARD_FORMAT = 'demon-dice-shard-1'
+
+def shard_range(num_simulations, shard_index, shard_count):
+    """ (start, count) of the games shard shard_index owns; shards tile 0 .. num_simulations-1 in order. """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Shard index {shard_index} is outside 0..{shard_count - 1}")
+    start = num_simulations * shard_index // shard_count
+    end = num_simulations * (shard_index + 1) // shard_count
+    return start, end - start
+
+def ruleset_digest(ruleset):
+    """ Hash of the CSV contents, so shards played on different copies of a table are caught at merge time. """
+    return file_digest(f"{ruleset}.csv").hex()
+
+def default_outputs(variant):
+    # Full logs are left out unless asked for; they dwarf everything else at this scale
+    return [name for name in VARIANTS[variant][1] if name != 'sim_logs']
+
+def run_shard(variant='FiveESimulations', ruleset='DemonDiceTable4', num_simulations=1000, seed=0,
+              shard_index=0, shard_count=1, outputs=None, out_dir='.'):
+    """ Play one shard and write it to out_dir. Returns the shard file path. """
+    if outputs is None:
+        outputs = default_outputs(variant)
+    start, count = shard_range(num_simulations, shard_index, shard_count)
+
+    # Sketches are folded in game by game; logs are only kept if they were asked for
+    aggregates = run_chunk(variant, ruleset, seed, start, count, list(outputs) + ['sketches'])
+    sketches = aggregates.pop('sketches')
+
+    shard = {
+        'format': SHARD_FORMAT,
+        'variant': variant,
+        'ruleset': ruleset,
+        'ruleset_sha256': ruleset_digest(ruleset),
+        'num_simulations': num_simulations,
+        'seed': seed,
+        'shard_index': shard_index,
+        'shard_count': shard_count,
+        'start': start,
+        'count': count,
+        'outputs': list(outputs),
+        'aggregates': aggregates,
+        'sketches': sketches
+    }
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{variant}_seed{seed}_shard{shard_index:05d}of{shard_count:05d}.shard")
+    save_checkpoint(path, shard)  # Written to a temp file and renamed, so readers never see a half-written shard
+    return path
+
+def load_shard(path):
+    with open(path, 'rb') as file:
+        shard = pickle.load(file)
+    if not isinstance(shard, dict) or shard.get('format') != SHARD_FORMAT:
+        raise ValueError(f"{path} is not a shard file")
+    return shard
+
+def merge_shards(paths):
+    """
+    Merge shard files into (results, sketches), results in the variant's
+    run_multiple_simulations shape (lists not requested from the shards are empty).
+    Raises ValueError for mixed runs, duplicate shards or missing shards.
+    """
+    shards = [(path, load_shard(path)) for path in paths]
+    if not shards:
+        raise ValueError("No shard files given")
+
+    run_keys = ('variant', 'ruleset_sha256', 'num_simulations', 'seed', 'shard_count', 'outputs')
+    first_path, first = shards[0]
+    by_index = {}
+    for path, shard in shards:
+        for key in run_keys:
+            if shard[key] != first[key]:
+                raise ValueError(f"{path} has {key}={shard[key]!r} but {first_path} has {first[key]!r}")
+        if shard['shard_index'] in by_index:
+            raise ValueError(f"Duplicate shard {shard['shard_index']}: {by_index[shard['shard_index']][0]} and {path}")
+        by_index[shard['shard_index']] = (path, shard)
+
+    missing = [i for i in range(first['shard_count']) if i not in by_index]
+    if missing:
+        raise ValueError(f"Missing shards {missing} of {first['shard_count']}")
+
+    aggregates = new_aggregates()
+    sketches = new_sketches()
+    for i in range(first['shard_count']):
+        _, shard = by_index[i]
+        merge_aggregates(aggregates, shard['aggregates'])
+        merge_sketches(sketches, shard['sketches'])
+    return as_results(first['variant'], aggregates), sketches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded Demon Dice batch runs")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="Play one shard of a seeded run")
+    run_parser.add_argument('--variant', default='FiveESimulations', choices=sorted(VARIANTS))
+    run_parser.add_argument('--ruleset', default='DemonDiceTable4')
+    run_parser.add_argument('--games', type=int, required=True, help="Games in the whole run, across all shards")
+    run_parser.add_argument('--seed', type=int, required=True)
+    run_parser.add_argument('--shard', type=int, required=True)
+    run_parser.add_argument('--of', type=int, required=True, dest='shard_count')
+    run_parser.add_argument('--outputs', nargs='*', default=None)
+    run_parser.add_argument('--out', default='.')
+
+    merge_parser = commands.add_parser('merge', help="Merge a complete set of shard files")
+    merge_parser.add_argument('paths', nargs='+')
+    merge_parser.add_argument('--out', default=None, help="Write the merged (results, sketches) as a pickle")
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        print(run_shard(args.variant, args.ruleset, args.games, args.seed, args.shard, args.shard_count,
+                        args.outputs, args.out))
+    else:
+        results, sketches = merge_shards(args.paths)
+        print(f"Merged {len(args.paths)} shards: {len(results[0])} games")
+        for name, values in sketch_quantiles(sketches).items():
+            print(name, values)
+        if args.out:
+            save_checkpoint(args.out, (results, sketches))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mergeable distribution summaries for very large runs. Turns lasted, cumulative
+damage at the end and first 'End' turn are all small bounded integers, so an exact
+count per value is both tiny and mergeable: shards just add their counts, and
+percentiles come out exactly as they would from the full lists. batch_runner
+emits them as the 'sketches' output, folding in each game as it finishes.
+"""
+import json
+from collections import Counter
+
+SKETCHED = ('turns', 'final_damage', 'first_end_turn')
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+def new_sketches():
+    return {name: Counter() for name in SKETCHED}
+
+def add_game(sketches, simulation_log):
+    """ Count one game's turns, end damage and first End turn (games with no End are left out, as in Multiplier). """
+    last_entry = simulation_log[-1]
+    sketches['turns'][last_entry['turn']] += 1
+    sketches['final_damage'][last_entry['cumulative_damage']] += 1  # Final turn applies no damage
+    for entry in simulation_log:
+        if 'End' in entry['events']:
+            sketches['first_end_turn'][entry['turn']] += 1
+            break
+
+def merge_sketches(sketches, other):
+    for name in SKETCHED:
+        sketches[name].update(other[name])
+    return sketches
+
+def quantile(counts, q):
+    """ Smallest value with at least a fraction q of the counted games at or below it (None if empty). """
+    total = sum(counts.values())
+    if total == 0:
+        return None
+    needed = q * total
+    running = 0
+    for value in sorted(counts):
+        running += counts[value]
+        if running >= needed:
+            return value
+    return max(counts)
+
+def sketch_quantiles(sketches, quantiles=DEFAULT_QUANTILES):
+    """ {name: {q: value}} for every sketched quantity, plus game counts. """
+    report = {}
+    for name in SKETCHED:
+        report[name] = {q: quantile(sketches[name], q) for q in quantiles}
+        report[name]['count'] = sum(sketches[name].values())
+    return report
+
+def save_sketches(path, sketches, **meta):
+    """ Write sketches (and any run description, e.g. seed and game range) as a small JSON file. """
+    data = {'meta': meta, 'sketches': {name: {str(k): v for k, v in sketches[name].items()} for name in SKETCHED}}
+    with open(path, 'w') as file:
+        json.dump(data, file)
+
+def load_sketches(path):
+    with open(path) as file:
+        data = json.load(file)
+    sketches = {name: Counter({int(k): v for k, v in data['sketches'].get(name, {}).items()}) for name in SKETCHED}
+    return sketches, data['meta']
+
+def merge_sketch_files(paths):
+    """ Combine per-shard sketch files into one set of sketches. """
+    merged = new_sketches()
+    for path in paths:
+        sketches, _ = load_sketches(path)
+        merge_sketches(merged, sketches)
+    return merged
+
+# Main execution block
+if __name__ == "__main__":
+    from batch_runner import run_chunk
+
+    paths = []
+    for shard in range(4):
+        path = f"sketch_shard{shard}.json"
+        chunk = run_chunk('FiveESimulations', 'DemonDiceTable4', 2024, shard * 2500, 2500, ['sketches'])
+        save_sketches(path, chunk['sketches'], variant='FiveESimulations', seed=2024, start=shard * 2500, count=2500)
+        paths.append(path)
+
+    for name, values in sketch_quantiles(merge_sketch_files(paths)).items():
+        print(name, values)
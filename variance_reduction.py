@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch estimates with variance reduction. Mean turns, mean fights and the share of
+each end mechanism come with a standard error that is right for the mode the games
+were played in:
+
+    plain       independent games, the usual s / sqrt(n)
+    antithetic  games 2k and 2k+1 are mirror images, so the pair averages are the
+                independent units
+    qmc         each scrambled Halton replicate is one independent estimate; the
+                error comes from the spread of the replicate means
+
+'efficiency' is how many plain games each game of the run was worth for that quantity.
+"""
+import math
+from statistics import mean, stdev
+from batch_stats import Z_95, QMC_REPLICATES, QMC_TURNS, STREAM_MODES, game_stream, summarize_game
+from batch_runner import load_engine, load_rules
+
+# Two-sided 95% Student t quantiles by degrees of freedom, for replicate-based intervals
+T_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+        10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131, 16: 2.120, 17: 2.110,
+        18: 2.101, 19: 2.093, 20: 2.086, 25: 2.060, 30: 2.042, 40: 2.021, 60: 2.000, 120: 1.980}
+
+END_SHARES = ('TPK', 'End Flags', '200 turns')
+
+def t_95(df):
+    """ 95% t quantile, rounding df down to the nearest tabulated value (normal beyond 120). """
+    if df > 120:
+        return Z_95
+    return T_95[max(d for d in T_95 if d <= df)]
+
+def game_values(summary):
+    """ The per-game numbers being estimated; end shares are 0/1 indicators. """
+    values = {'turns': summary['turns'], 'fights': summary['fight_count']}
+    for mechanism in END_SHARES:
+        values[f"share {mechanism}"] = 1.0 if summary['end_mechanism'] == mechanism else 0.0
+    return values
+
+def play_games(variant='FiveESimulations', ruleset='DemonDiceTable4', num_simulations=1000, seed=0,
+               mode='plain', replicates=QMC_REPLICATES, qmc_turns=QMC_TURNS):
+    """ Per-game value dicts for games 0 .. num_simulations-1 of a run in the given mode. """
+    engine = load_engine(variant)
+    rules = load_rules(variant, ruleset)
+    games = []
+    for i in range(num_simulations):
+        simulation_log, f_count = engine.sim(rng=game_stream(seed, i, mode, replicates, qmc_turns),
+                                             rules=rules, verbose=False)
+        games.append(game_values(summarize_game(simulation_log, f_count)))
+    return games
+
+def _units(values, mode, replicates):
+    """ Split per-game values into independent units (games, pair means or replicate means). """
+    if mode == 'plain':
+        return values
+    if mode == 'antithetic':
+        return [(values[k] + values[k + 1]) / 2 for k in range(0, len(values) - 1, 2)]
+    if mode == 'qmc':
+        return [mean(values[r::replicates]) for r in range(replicates) if values[r::replicates]]
+    raise ValueError(f"Unknown stream mode {mode!r}, expected one of {STREAM_MODES}")
+
+def estimate(values, mode='plain', replicates=QMC_REPLICATES):
+    """
+    Mean of one per-game quantity with a mode-correct standard error and 95% interval.
+    Odd antithetic runs drop their last, unpaired game.
+    """
+    units = _units(values, mode, replicates)
+    n = len(units)
+    if n < 2:
+        raise ValueError(f"Need at least two independent units for an error estimate, got {n}")
+    m = mean(units)
+    se = stdev(units) / math.sqrt(n)
+    q = t_95(n - 1) if mode == 'qmc' else Z_95  # Replicate counts are small, so use t there
+
+    games_used = n * (len(values) // n) if mode != 'antithetic' else 2 * n
+    plain_variance = stdev(values) ** 2 / games_used  # What the same number of independent games would give
+    return {
+        'mean': m, 'se': se, 'low': m - q * se, 'high': m + q * se,
+        'units': n, 'games': games_used,
+        'efficiency': plain_variance / se ** 2 if se > 0 else None  # None when nothing varied
+    }
+
+def estimate_all(games, mode='plain', replicates=QMC_REPLICATES):
+    """ estimate() for every quantity in game_values. """
+    return {name: estimate([game[name] for game in games], mode, replicates) for name in games[0]}
+
+def run_estimates(variant='FiveESimulations', ruleset='DemonDiceTable4', num_simulations=1000, seed=0,
+                  mode='plain', replicates=QMC_REPLICATES, qmc_turns=QMC_TURNS):
+    games = play_games(variant, ruleset, num_simulations, seed, mode, replicates, qmc_turns)
+    return estimate_all(games, mode, replicates)
+
+def print_estimates(estimates, mode):
+    print(f"\n{mode} ({next(iter(estimates.values()))['games']} games)")
+    print(f"{'Quantity':<18} {'Mean':>9} {'SE':>9} {'95% CI':>22} {'Efficiency':>11}")
+    for name, e in estimates.items():
+        interval = f"[{e['low']:.4f}, {e['high']:.4f}]"
+        efficiency = f"{e['efficiency']:.2f}x" if e['efficiency'] is not None else '-'
+        print(f"{name:<18} {e['mean']:>9.4f} {e['se']:>9.4f} {interval:>22} {efficiency:>11}")
+
+# Main execution block
+if __name__ == "__main__":
+    for stream_mode in STREAM_MODES:
+        print_estimates(run_estimates(num_simulations=8000, seed=2024, mode=stream_mode), stream_mode)